@@ -0,0 +1,38 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from . import metrics
+
+
+def token_cache_key(key):
+    return 'token:{}'.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(keys):
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Токен с пользователем берется из кэша, а не join-ом в базе.
+
+    Запись сбрасывается при удалении токена (выход, удаление пользователя)
+    и при сохранении пользователя (смена пароля, блокировка), см. signals.
+    Сброс в кэше процесса не дошел бы до других воркеров, и удаленный
+    токен принимался бы до TOKEN_CACHE_TIMEOUT, поэтому без общего кэша
+    (SHARED_CACHE) токен всегда проверяется в базе.
+    """
+    def authenticate_credentials(self, key):
+        if not settings.SHARED_CACHE:
+            return super().authenticate_credentials(key)
+        cache_key = token_cache_key(key)
+        user = cache.get(cache_key)
+        if user is not None and user.is_active:
+            metrics.increment('token_cache_hits_total')
+            return (user, self.get_model()(key=key, user=user))
+        metrics.increment('token_cache_misses_total')
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, user, settings.TOKEN_CACHE_TIMEOUT)
+        return (user, token)
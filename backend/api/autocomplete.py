@@ -0,0 +1,56 @@
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+
+from .cache import get_cache_version
+from .serializers import IngredientSerializer
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов в памяти процесса.
+
+    Привязан к версии кэша 'ingredients': сигналы меняют ее в общем кэше,
+    и каждый воркер перестраивает индекс при следующем поиске. Версия
+    сверяется при каждом поиске, поэтому воркер, который gunicorn заново
+    форкнул от мастера со старой копией индекса, тоже его перестроит.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = None
+        self._items = None
+
+    def build(self, version=None):
+        version = version or get_cache_version('ingredients')
+        items = sorted(
+            IngredientSerializer(Ingredient.objects.all(), many=True).data,
+            key=lambda item: (item['name'].lower(), item['id'])
+        )
+        with self._lock:
+            self._keys = [item['name'].lower() for item in items]
+            self._items = items
+            self._version = version
+
+    def _load(self):
+        version = get_cache_version('ingredients')
+        if self._version != version:
+            self.build(version)
+        with self._lock:
+            return self._keys, self._items
+
+    def search(self, name):
+        """Сначала совпадения по началу названия, затем по вхождению."""
+        keys, items = self._load()
+        name = name.lower()
+        start = end = bisect_left(keys, name)
+        while end < len(keys) and keys[end].startswith(name):
+            end += 1
+        contains = [
+            item for index, item in enumerate(items)
+            if name in keys[index] and not start <= index < end
+        ]
+        return items[start:end] + contains
+
+
+ingredient_index = IngredientIndex()
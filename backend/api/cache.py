@@ -0,0 +1,76 @@
+import hashlib
+import json
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache_version(namespace):
+    version = cache.get(f'{namespace}:version')
+    if version is None:
+        version = uuid4().hex
+        cache.set(f'{namespace}:version', version, None)
+    return version
+
+
+def invalidate_cache(namespace):
+    """Меняет версию пространства имен, старые ключи истекают сами."""
+    cache.set(f'{namespace}:version', uuid4().hex, None)
+
+
+def make_etag(data):
+    content = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return '"{}"'.format(hashlib.md5(content.encode()).hexdigest())
+
+
+def etag_response(request, data, etag):
+    """Ответ с сильным ETag или 304, если клиент прислал тот же ETag."""
+    if_none_match = request.headers.get('If-None-Match', '')
+    etags = parse_etags(if_none_match)
+    if etag in etags or '*' in etags:
+        return Response(
+            status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag}
+        )
+    return Response(data, headers={'ETag': etag})
+
+
+class CachedResponseMixin:
+    """Кэширует сериализованные ответы list/retrieve справочников.
+
+    Только с общим кэшем (SHARED_CACHE): версию меняет тот процесс, где
+    сработал сигнал, и остальные воркеры должны ее увидеть.
+    """
+    cache_namespace = None
+
+    def get_cache_key(self, request):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        version = get_cache_version(self.cache_namespace)
+        return f'{self.cache_namespace}:{version}:{path}'
+
+    def cached_response(self, request, get_data):
+        if not settings.SHARED_CACHE:
+            data = get_data()
+            return etag_response(request, data, make_etag(data))
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            data = get_data()
+            cached = (data, make_etag(data))
+            cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        return etag_response(request, *cached)
+
+    def list(self, request, *args, **kwargs):
+        parent_list = super().list
+        return self.cached_response(
+            request, lambda: parent_list(request, *args, **kwargs).data
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        parent_retrieve = super().retrieve
+        return self.cached_response(
+            request, lambda: parent_retrieve(request, *args, **kwargs).data
+        )
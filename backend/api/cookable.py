@@ -0,0 +1,174 @@
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from recipes.models import IngredientInRecipe, Recipe
+
+# Транзакция с рецептом видна другим процессам только после коммита,
+# а updated_at ставится раньше, поэтому синхронизация берет окно с запасом.
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class CoverageResult:
+    """Рецепты по убыванию покрытия, срезы отдают (id, matched, total)."""
+    def __init__(self, recipe_ids, matched, totals):
+        self.recipe_ids = recipe_ids
+        self.matched = matched
+        self.totals = totals
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def __getitem__(self, index):
+        return list(zip(
+            self.recipe_ids[index].tolist(),
+            self.matched[index].tolist(),
+            self.totals[index].tolist(),
+        ))
+
+
+class RecipeIngredientIndex:
+    """Инвертированный индекс ингредиент -> рецепты в памяти процесса.
+
+    Основа хранится в массивах NumPy в формате CSR: для каждого
+    ингредиента отсортированный список позиций рецептов. Рецепты,
+    измененные после построения, лежат в небольшом словаре поверх основы,
+    а их строки в основе маскируются. Изменения из других процессов
+    подтягиваются по Recipe.updated_at не чаще раза в
+    RECIPE_INGREDIENT_INDEX_SYNC_SECONDS, удаленные там рецепты
+    отбрасываются при чтении страницы.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+
+    def build(self):
+        """Полная загрузка из IngredientInRecipe."""
+        with self._lock:
+            started_at = timezone.now()
+            pairs = IngredientInRecipe.objects.order_by().values_list(
+                'ingredients_id', 'recipe_id'
+            ).distinct()
+            flat = np.fromiter(
+                (value for pair in pairs.iterator() for value in pair),
+                dtype=np.int64,
+            )
+            ingredients, recipes = flat[0::2], flat[1::2]
+            self.recipe_ids = np.unique(recipes)
+            recipe_positions = np.searchsorted(self.recipe_ids, recipes)
+            self.totals = np.bincount(
+                recipe_positions, minlength=len(self.recipe_ids)
+            ).astype(np.int32)
+            order = np.lexsort((recipe_positions, ingredients))
+            self.ingredient_ids, starts = np.unique(
+                ingredients[order], return_index=True
+            )
+            self.offsets = np.append(starts, len(order))
+            self.positions = recipe_positions[order].astype(np.int32)
+            self.masked = np.zeros(len(self.recipe_ids), dtype=bool)
+            self.overrides = {}
+            self.synced_at = started_at
+            self.checked_at = time.monotonic()
+            self._built = True
+
+    def ensure_built(self):
+        with self._lock:
+            if not self._built:
+                self.build()
+            elif len(self.overrides) > settings.RECIPE_INGREDIENT_INDEX_REBUILD:
+                self.build()
+            elif (time.monotonic() - self.checked_at
+                    > settings.RECIPE_INGREDIENT_INDEX_SYNC_SECONDS):
+                self.sync()
+
+    def _set(self, recipe_id, ingredient_ids):
+        position = np.searchsorted(self.recipe_ids, recipe_id)
+        if (position < len(self.recipe_ids)
+                and self.recipe_ids[position] == recipe_id):
+            self.masked[position] = True
+        self.overrides[recipe_id] = frozenset(ingredient_ids)
+
+    def update(self, recipe_ids):
+        """Перечитывает ингредиенты рецептов из базы."""
+        with self._lock:
+            if not self._built:
+                return
+            ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+            for recipe_id, ingredient_id in (
+                IngredientInRecipe.objects.filter(recipe_id__in=recipe_ids)
+                .values_list('recipe_id', 'ingredients_id')
+            ):
+                ingredients[recipe_id].add(ingredient_id)
+            for recipe_id, ingredient_ids in ingredients.items():
+                self._set(recipe_id, ingredient_ids)
+
+    def discard(self, recipe_ids):
+        with self._lock:
+            if self._built:
+                for recipe_id in recipe_ids:
+                    self._set(recipe_id, ())
+
+    def sync(self):
+        """Подтягивает рецепты, измененные другими процессами."""
+        with self._lock:
+            started_at = timezone.now()
+            changed = list(
+                Recipe.objects.filter(
+                    updated_at__gte=self.synced_at - SYNC_OVERLAP
+                ).values_list('pk', flat=True)
+            )
+            if changed:
+                self.update(changed)
+            self.synced_at = started_at
+            self.checked_at = time.monotonic()
+
+    def search(self, ingredient_ids, min_coverage=0.0):
+        """Рецепты, где есть хотя бы один из ингредиентов.
+
+        Сортировка по доле имеющихся ингредиентов рецепта, затем по их
+        числу и по новизне.
+        """
+        self.ensure_built()
+        with self._lock:
+            wanted = np.unique(np.asarray(list(ingredient_ids), np.int64))
+            counts = np.zeros(len(self.recipe_ids), dtype=np.int32)
+            found = np.searchsorted(self.ingredient_ids, wanted)
+            for index, ingredient_id in zip(found, wanted):
+                if (index < len(self.ingredient_ids)
+                        and self.ingredient_ids[index] == ingredient_id):
+                    counts[self.positions[
+                        self.offsets[index]:self.offsets[index + 1]
+                    ]] += 1
+            counts[self.masked] = 0
+            candidates = np.flatnonzero(counts)
+            recipe_ids = self.recipe_ids[candidates]
+            matched = counts[candidates]
+            totals = self.totals[candidates]
+
+            wanted_set = set(wanted.tolist())
+            extra = [
+                (recipe_id, len(ingredients & wanted_set), len(ingredients))
+                for recipe_id, ingredients in self.overrides.items()
+                if ingredients & wanted_set
+            ]
+        if extra:
+            extra = np.array(extra, dtype=np.int64).T
+            recipe_ids = np.concatenate((recipe_ids, extra[0]))
+            matched = np.concatenate((matched, extra[1]))
+            totals = np.concatenate((totals, extra[2]))
+
+        coverage = matched / totals
+        keep = coverage >= min_coverage
+        recipe_ids, matched = recipe_ids[keep], matched[keep]
+        totals, coverage = totals[keep], coverage[keep]
+        order = np.lexsort((-recipe_ids, -matched, -coverage))
+        return CoverageResult(
+            recipe_ids[order], matched[order], totals[order]
+        )
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
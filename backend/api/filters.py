@@ -1,11 +1,117 @@
-from django_filters import CharFilter, FilterSet
+from django import forms
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef, Q,
+                              Value, When)
+from django_filters import (BooleanFilter, CharFilter, ChoiceFilter,
+                            FilterSet, MultipleChoiceFilter, NumberFilter)
+from django_filters.widgets import BooleanWidget
 
-from recipes.models import Ingredient
+from recipes.models import Ingredient, Recipe
 
 
 class IngredientFilter(FilterSet):
-    name = CharFilter(lookup_expr='istartswith')
+    name = CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+    def filter_name(self, queryset, name, value):
+        """Сначала совпадения по началу названия, затем по вхождению.
+
+        Ветки разделены, чтобы на PostgreSQL начало названия искалось по
+        индексу text_pattern_ops, а вхождение — по триграммам.
+        """
+        queryset = queryset.order_by()
+        starts = queryset.filter(name__istartswith=value).annotate(
+            is_contains=Value(0, output_field=IntegerField())
+        )
+        contains = queryset.filter(name__icontains=value).exclude(
+            name__istartswith=value
+        ).annotate(is_contains=Value(1, output_field=IntegerField()))
+        return starts.union(contains, all=True).order_by(
+            'is_contains', 'name'
+        )
+
+
+class SlugsField(forms.MultipleChoiceField):
+    """Список слагов без проверки по справочнику."""
+    def valid_value(self, value):
+        return True
+
+
+class SlugsFilter(MultipleChoiceFilter):
+    field_class = SlugsField
+
+
+class RecipeFilter(FilterSet):
+    """Фильтры рецептов по аннотациям get_queryset и подзапросам EXISTS."""
+    is_favorited = BooleanFilter(
+        method='filter_is_favorited', widget=BooleanWidget()
+    )
+    is_in_shopping_cart = BooleanFilter(
+        method='filter_is_in_shopping_cart', widget=BooleanWidget()
+    )
+    tags = SlugsFilter(method='filter_tags')
+    author = NumberFilter(field_name='author')
+    search = CharFilter(method='filter_search')
+    ordering = ChoiceFilter(
+        choices=(('trending', 'trending'),), method='filter_ordering'
+    )
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'tags', 'author', 'search',
+            'ordering',
+        )
+
+    def filter_by_annotation(self, queryset, annotation, value):
+        if not self.request.user.is_authenticated:
+            return queryset.none() if value else queryset
+        return queryset.filter(**{annotation: value})
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_by_annotation(queryset, 'favorited', value)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_by_annotation(queryset, 'in_shopping_cart', value)
+
+    def filter_tags(self, queryset, name, value):
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__slug__in=value
+            )
+        ))
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию и описанию, лучшие совпадения первыми.
+
+        На PostgreSQL — по search_vector с русской морфологией и индексом
+        GIN, на остальных базах — по вхождению подстроки (SQLite
+        приводит регистр только у латиницы).
+        """
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(
+                value, config='russian', search_type='websearch'
+            )
+            return queryset.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-id')
+        return queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        ).annotate(
+            rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                When(name__icontains=value, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        ).order_by('rank', '-id')
+
+    def filter_ordering(self, queryset, name, value):
+        """Только рецепты из рейтинга TrendingRecipe, по убыванию."""
+        return queryset.filter(trending__isnull=False).order_by(
+            '-trending__score', '-id'
+        )
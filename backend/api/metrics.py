@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, float('inf'))
+CONNECT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, float('inf')
+)
+HISTOGRAM_BUCKETS = {
+    'http_request_queries': QUERY_BUCKETS,
+    'db_connection_setup_seconds': CONNECT_BUCKETS,
+}
+
+# Метрики завершившихся воркеров, см. mark_process_dead.
+ARCHIVE_FILE = 'archive.json'
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_flushed_at = 0
+_pending = None
+_timings = ContextVar('timings', default=None)
+
+
+def increment(name, value=1):
+    """Счетчики живут в памяти процесса, общий вид собирает collect()."""
+    with _lock:
+        _counters[name] += value
+
+
+def get_counters():
+    with _lock:
+        return dict(_counters)
+
+
+def observe(name, labels, value):
+    """Добавляет значение в гистограмму name с метками labels."""
+    buckets = HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS)
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(buckets), 0, 0]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def snapshot():
+    """Метрики процесса в виде, пригодном для JSON."""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'histograms': [
+                [name, labels, list(counts), total, count]
+                for (name, labels), (counts, total, count)
+                in _histograms.items()
+            ],
+        }
+
+
+def merge(counters, histograms, data):
+    for name, value in data['counters'].items():
+        counters[name] += value
+    for name, labels, counts, total, count in data['histograms']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        histogram = histograms.get(key)
+        if histogram is None:
+            histograms[key] = [list(counts), total, count]
+            continue
+        histogram[0] = [old + new for old, new in zip(histogram[0], counts)]
+        histogram[1] += total
+        histogram[2] += count
+
+
+def write_json(path, data):
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+def read_json(path):
+    """None, если файл уже удален или дописывается."""
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def flush(force=False):
+    """Сохраняет метрики процесса в METRICS_MULTIPROC_DIR.
+
+    Из этих файлов /metrics любого воркера собирает метрики всех.
+    Пишется не чаще раза в METRICS_FLUSH_SECONDS; пропущенная запись
+    откладывается таймером, чтобы хвост простаивающего воркера не терялся.
+    """
+    global _flushed_at, _pending
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+    with _lock:
+        wait = settings.METRICS_FLUSH_SECONDS - (time.monotonic() - _flushed_at)
+        if not force and wait > 0:
+            if _pending is None:
+                _pending = threading.Timer(wait, flush, kwargs={'force': True})
+                _pending.daemon = True
+                _pending.start()
+            return
+        _flushed_at = time.monotonic()
+        if _pending is not None:
+            _pending.cancel()
+            _pending = None
+    write_json(os.path.join(directory, f'{os.getpid()}.json'), snapshot())
+
+
+def mark_process_dead(directory, pid):
+    """Переносит метрики завершившегося воркера в общий архив.
+
+    Вызывается из мастера gunicorn (child_exit), он единственный пишет
+    архив, так что счетчики не теряются при перезапуске воркеров.
+    """
+    path = os.path.join(directory, f'{pid}.json')
+    data = read_json(path)
+    if data is None:
+        return
+    counters, histograms = defaultdict(float), {}
+    archive = read_json(os.path.join(directory, ARCHIVE_FILE))
+    if archive is not None:
+        merge(counters, histograms, archive)
+    merge(counters, histograms, data)
+    write_json(os.path.join(directory, ARCHIVE_FILE), {
+        'counters': counters,
+        'histograms': [
+            [name, labels, counts, total, count]
+            for (name, labels), (counts, total, count) in histograms.items()
+        ],
+    })
+    os.remove(path)
+
+
+def collect():
+    """Сумма метрик этого процесса и файлов других воркеров."""
+    counters, histograms = defaultdict(float), {}
+    directory = settings.METRICS_MULTIPROC_DIR
+    if directory:
+        own = f'{os.getpid()}.json'
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json') or name == own:
+                continue
+            data = read_json(os.path.join(directory, name))
+            if data is not None:
+                merge(counters, histograms, data)
+    merge(counters, histograms, snapshot())
+    return counters, histograms
+
+
+@contextmanager
+def collect_timings():
+    """Собирает время участков запроса, отмеченных timer()."""
+    timings = defaultdict(float)
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def timer(name):
+    """Вложенные участки с тем же именем не считаются дважды."""
+    timings = _timings.get()
+    if timings is None or timings.get(f'{name}:active'):
+        yield
+        return
+    timings[f'{name}:active'] = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] += time.perf_counter() - started
+        timings[f'{name}:active'] = False
+
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(
+            key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for key, value in labels.items()
+    ))
+
+
+def render_prometheus():
+    """Текстовый формат Prometheus 0.0.4."""
+    counters, histograms = collect()
+    lines = []
+    for name, value in sorted(counters.items()):
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {value}')
+    hits = counters.get('token_cache_hits_total', 0)
+    lookups = hits + counters.get('token_cache_misses_total', 0)
+    if lookups:
+        lines.append('# TYPE token_cache_hit_ratio gauge')
+        lines.append(f'token_cache_hit_ratio {hits / lookups:.4f}')
+
+    typed = set()
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {name} histogram')
+        buckets = HISTOGRAM_BUCKETS.get(name, LATENCY_BUCKETS)
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else bound
+            lines.append(
+                f'{name}_bucket{format_labels(labels, le=le)} {cumulative}'
+            )
+        lines.append(f'{name}_sum{format_labels(labels)} {total}')
+        lines.append(f'{name}_count{format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
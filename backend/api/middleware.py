@@ -0,0 +1,94 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from . import metrics
+
+logger = logging.getLogger('api.slow_requests')
+
+MAX_SQL_SAMPLES = 500
+
+
+def get_view_name(request, view_func):
+    """RecipeViewSet.list, UserViewSet.subscriptions и т.п."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class QueryCollector:
+    """Обертка connection.execute_wrapper: считает запросы и их время."""
+    def __init__(self, keep_samples):
+        self.keep_samples = keep_samples
+        self.count = 0
+        self.duration = 0
+        self.samples = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.keep_samples and len(self.samples) < MAX_SQL_SAMPLES:
+                self.samples.append((elapsed, sql))
+
+
+class QueryMetricsMiddleware:
+    """Гистограммы числа запросов, времени базы, сериализаторов и ответа.
+
+    Включается REQUEST_METRICS_ENABLED. Запросы дольше SLOW_REQUEST_SECONDS
+    пишутся в лог api.slow_requests с самыми долгими SQL. У потоковых
+    ответов учитывается только время до начала отдачи.
+    """
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        slow_after = settings.SLOW_REQUEST_SECONDS
+        collector = QueryCollector(keep_samples=slow_after is not None)
+        started = time.perf_counter()
+        with connection.execute_wrapper(collector), \
+                metrics.collect_timings() as timings:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        labels = {
+            'view': getattr(request, 'metrics_view', 'unresolved'),
+            'method': request.method,
+        }
+        metrics.observe('http_request_duration_seconds', labels, elapsed)
+        metrics.observe('http_request_queries', labels, collector.count)
+        metrics.observe('http_request_db_seconds', labels, collector.duration)
+        metrics.observe(
+            'http_request_serializer_seconds', labels, timings['serializer']
+        )
+        if slow_after is not None and elapsed >= slow_after:
+            self.log_slow_request(request, labels, elapsed, collector)
+        metrics.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_name(request, view_func)
+
+    def log_slow_request(self, request, labels, elapsed, collector):
+        samples = sorted(collector.samples, reverse=True)
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.3f с, %d SQL за %.3f с\n%s',
+            request.method, request.get_full_path(), labels['view'], elapsed,
+            collector.count, collector.duration,
+            '\n'.join(
+                f'{duration * 1000:.1f} ms: {sql}'
+                for duration, sql in samples[:settings.SLOW_REQUEST_SQL_SAMPLES]
+            )
+        )
@@ -1,6 +1,223 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .validators import MAX_ID, is_valid_id
+
+
+class ProbedPage(Page):
+    """Страница, о следующей за которой известно по лишней строке."""
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self.has_next_page = has_next
+
+    def has_next(self):
+        return self.has_next_page
+
+
+class CappedCountPaginator(Paginator):
+    """Считает не больше PAGINATION_COUNT_LIMIT объектов.
+
+    Если объектов больше, count равен пределу, а страницы за ним
+    проверяются выборкой на одну строку больше страницы.
+    """
+    capped = False
+
+    @cached_property
+    def count(self):
+        limit = settings.PAGINATION_COUNT_LIMIT
+        if limit is None or not isinstance(self.object_list, QuerySet):
+            return super().count
+        count = self.object_list[:limit + 1].count()
+        self.capped = count > limit
+        return min(count, limit)
+
+    def validate_number(self, number):
+        if not (self.count and self.capped):
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        if (number - 1) * self.per_page > MAX_ID:
+            raise EmptyPage(_('That page contains no results'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.capped:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects:
+            raise EmptyPage(_('That page contains no results'))
+        return ProbedPage(
+            objects[:self.per_page], number, self,
+            has_next=len(objects) > self.per_page,
+        )
+
+
+class IdCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с режимами без подсчета и по курсору.
+
+    ?pagination=cursor переключает на курсор по -id или по уникальному
+    полю, по которому отсортирован queryset, ?count=0 отключает COUNT(*)
+    для номеров страниц.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    django_paginator_class = CappedCountPaginator
+    cursor_pagination_class = IdCursorPagination
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor_pagination = None
+        self.count_skipped = False
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if (request.query_params.get('pagination') == 'cursor'
+                or cursor_param in request.query_params):
+            self.cursor_pagination = self.cursor_pagination_class()
+            self.cursor_pagination.ordering = self.get_cursor_ordering(
+                queryset
+            )
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        if request.query_params.get(self.count_query_param) == '0':
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_cursor_ordering(self, queryset):
+        """Курсор не должен менять порядок выдачи.
+
+        Ранжированную выдачу (поиск, популярные) по курсору не пролистать:
+        ее порядок задают вычисляемые значения.
+        """
+        ordering = queryset.query.order_by
+        if not ordering:
+            return self.cursor_pagination_class.ordering
+        if len(ordering) == 1 and isinstance(ordering[0], str):
+            try:
+                field = queryset.model._meta.get_field(ordering[0].lstrip('-'))
+            except FieldDoesNotExist:
+                field = None
+            if field is not None and field.unique:
+                return ordering[0]
+        raise ValidationError({'pagination': [
+            'Для этой сортировки курсор недоступен, используйте page'
+        ]})
+
+    def paginate_without_count(self, queryset, request):
+        """Берет на один объект больше страницы, чтобы узнать о следующей."""
+        self.count_skipped = True
+        page_size = self.get_page_size(request)
+        page_number = request.query_params.get(self.page_query_param, '1')
+        if (not is_valid_id(page_number)
+                or (int(page_number) - 1) * page_size > MAX_ID):
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='Неверный номер страницы'
+            ))
+        self.page_number = int(page_number)
+        offset = (self.page_number - 1) * page_size
+        objects = list(queryset[offset:offset + page_size + 1])
+        self.has_next_page = len(objects) > page_size
+        return objects[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        if not self.count_skipped:
+            return super().get_paginated_response(data)
+        url = self.request.build_absolute_uri()
+        next_link = previous_link = None
+        if self.has_next_page:
+            next_link = replace_query_param(
+                url, self.page_query_param, self.page_number + 1
+            )
+        if self.page_number == 2:
+            previous_link = remove_query_param(url, self.page_query_param)
+        elif self.page_number > 2:
+            previous_link = replace_query_param(
+                url, self.page_query_param, self.page_number - 1
+            )
+        return Response(OrderedDict([
+            ('count', None),
+            ('next', next_link),
+            ('previous', previous_link),
+            ('results', data),
+        ]))
+
+
+class SequencePagination(PageNumberPagination):
+    """Номера страниц для готового списка в памяти."""
     page_size = 6
+    max_page_size = 100
     page_size_query_param = 'limit'
+
+
+class FeedPagination(BasePagination):
+    """Курсор ленты — id последнего рецепта страницы.
+
+    Лента собирается из нескольких источников, поэтому страница
+    запрашивается списком id, а не срезом queryset.
+    """
+    page_size = 6
+    max_page_size = 100
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        """Неверный limit, как в PageNumberPagination, дает размер по умолчанию."""
+        value = request.query_params.get(self.page_size_query_param, '')
+        if is_valid_id(value):
+            return min(int(value), self.max_page_size)
+        return self.page_size
+
+    def get_cursor(self, request):
+        value = request.query_params.get(self.cursor_query_param)
+        if value is None:
+            return None
+        if not is_valid_id(value):
+            raise ValidationError({self.cursor_query_param: ['Неверный курсор']})
+        return int(value)
+
+    def paginate_ids(self, request, get_ids):
+        """get_ids(before, limit) возвращает id по убыванию."""
+        self.request = request
+        page_size = self.get_page_size(request)
+        ids = get_ids(self.get_cursor(request), page_size + 1)
+        self.has_next_page = len(ids) > page_size
+        self.ids = ids[:page_size]
+        return self.ids
+
+    def get_paginated_response(self, data):
+        next_link = None
+        if self.has_next_page:
+            next_link = replace_query_param(
+                self.request.build_absolute_uri(),
+                self.cursor_query_param, self.ids[-1]
+            )
+        return Response(OrderedDict([
+            ('next', next_link),
+            ('previous', None),
+            ('results', data),
+        ]))
@@ -1,13 +1,61 @@
-from drf_extra_fields.fields import Base64ImageField
+import base64
+import binascii
+from collections import Counter
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Manager, Prefetch, prefetch_related_objects
 from rest_framework import serializers, status
 from rest_framework.validators import ValidationError
 
+from recipes.feed import enqueue_fanout
+from recipes.images import enqueue_image, sorted_renditions
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
                             Recipe, ShoppingCart, Tag)
+from recipes.similar import enqueue_similar
 from users.models import Follow, User
 
+from . import metrics
+from .cache import get_cache_version
+from .validators import is_valid_id
+
+
+class QueuedBase64ImageField(serializers.ImageField):
+    """Только декодирует base64, проверка и сжатие картинки идут в воркере."""
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid')
+        header, separator, encoded = data.partition(';base64,')
+        if not separator:
+            header, encoded = '', data
+        extension = header.rpartition('/')[2].lower()
+        if not extension.isalnum():
+            extension = 'img'
+        try:
+            content = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            self.fail('invalid_image')
+        if not content:
+            self.fail('empty')
+        if len(content) > settings.RECIPE_IMAGE_MAX_BYTES:
+            raise ValidationError(
+                f'Картинка больше {settings.RECIPE_IMAGE_MAX_BYTES} байт'
+            )
+        return ContentFile(content, name=f'{uuid4().hex}.{extension}')
+
+
+class TimedSerializerMixin:
+    """Время сериализации попадает в метрики запроса."""
+    def to_representation(self, instance):
+        with metrics.timer('serializer'):
+            return super().to_representation(instance)
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор регистрации/получения информации пользователя."""
     is_subscribed = serializers.SerializerMethodField(
         method_name='get_is_subscribed'
@@ -40,6 +88,8 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
@@ -64,9 +114,7 @@ class FollowSerializer(UserSerializer):
         method_name='get_is_subscribed'
     )
     recipes = serializers.SerializerMethodField(method_name='get_recipes')
-    recipes_count = serializers.SerializerMethodField(
-        method_name='get_recipes_count'
-    )
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         fields = (
@@ -82,29 +130,19 @@ class FollowSerializer(UserSerializer):
         model = User
         read_only_fields = ('email', 'username', 'first_name', 'last_name',)
 
-    def get_is_subscribed(self, obj):
-        request = self.context['request']
-        if not request or not request.user.is_authenticated:
-            return False
-        return Follow.objects.filter(user=request.user, author=obj).exists()
-
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj)[:6]
-        serializer = RecipeFavoriteSerializer(recipes, many=True)
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes = Recipe.objects.filter(author=obj)[:6]
+        serializer = RecipeFavoriteSerializer(
+            recipes, many=True, context=self.context
+        )
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        recipes = Recipe.objects.filter(author=obj).count()
-        return recipes
-
     def validate(self, value):
         user = self.context['request'].user
         author = self.instance
-        if Follow.objects.filter(user=user, author=author).exists():
-            raise ValidationError(
-                detail='Вы уже подписаны на этого автора',
-                code=status.HTTP_400_BAD_REQUEST
-            )
         if author == user:
             raise ValidationError(
                 detail='Нельзя подпиываться на себя',
@@ -114,14 +152,15 @@ class FollowSerializer(UserSerializer):
         return value
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     """Сериализатор получения информации об ингредиенте."""
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit',)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Сериализатор получения информации о теге."""
     class Meta:
         model = Tag
@@ -130,16 +169,91 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeFavoriteSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Уменьшенные копии картинки рецепта.
+
+    ?image_width=<px> выбирает копию для image_thumb,
+    ?image_format=webp|jpeg — формат копий.
+    """
+    image_thumb = serializers.SerializerMethodField(
+        method_name='get_image_thumb'
+    )
+    srcset = serializers.SerializerMethodField(method_name='get_srcset')
+
+    def get_image_params(self):
+        request = self.context.get('request')
+        params = request.query_params if request else {}
+        width = params.get('image_width', '')
+        image_format = params.get('image_format', 'jpeg')
+        if image_format not in ('jpeg', 'webp'):
+            image_format = 'jpeg'
+        return (
+            int(width) if is_valid_id(width)
+            else min(settings.RECIPE_IMAGE_WIDTHS),
+            image_format,
+        )
+
+    def build_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_image_thumb(self, obj):
+        width, image_format = self.get_image_params()
+        renditions = sorted_renditions(obj, image_format)
+        if not renditions:
+            return self.build_url(obj.image.name) if obj.image else None
+        for rendition_width, name in renditions:
+            if rendition_width >= width:
+                return self.build_url(name)
+        return self.build_url(renditions[-1][1])
+
+    def get_srcset(self, obj):
+        _, image_format = self.get_image_params()
+        return ', '.join(
+            f'{self.build_url(name)} {width}w'
+            for width, name in sorted_renditions(obj, image_format)
+        )
+
+    def add_image_fields(self, recipe, representation):
+        representation['image_thumb'] = self.get_image_thumb(recipe)
+        representation['srcset'] = self.get_srcset(recipe)
+        return representation
+
+
+class RecipeFavoriteSerializer(RecipeImageSerializer,
+                               serializers.ModelSerializer):
     """Сериализатор отображения рецепта при добавление в избранное."""
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = (
+            'id', 'name', 'image', 'image_thumb', 'srcset', 'cooking_time'
+        )
+
+
+RECIPE_PREFETCH = (
+    'tags',
+    Prefetch(
+        'ingredientinrecipe_set',
+        queryset=IngredientInRecipe.objects.select_related('ingredients')
+    ),
+)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Принимает id без запроса, объекты достаются в validate одним in_bulk."""
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
 
 
 class CreateIngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для создание ингредиентов в рецепте."""
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
         required=True,
         source='ingredients'
@@ -180,8 +294,23 @@ class GetIngredientInRecipeSerializer(serializers.ModelSerializer):
         return obj.amount
 
 
-class GetRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор получения рецепта."""
+class RecipeListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """Читает общие представления страницы рецептов одним запросом в кэш."""
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        shared = self.child.get_shared_representations(recipes)
+        return [
+            self.child.add_viewer_fields(recipe, representation)
+            for recipe, representation in zip(recipes, shared)
+        ]
+
+
+class GetRecipeSerializer(RecipeImageSerializer, serializers.ModelSerializer):
+    """Сериализатор получения рецепта.
+
+    Не зависящая от пользователя часть кэшируется по id и updated_at
+    рецепта, поля пользователя подставляются при каждом запросе.
+    """
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     ingredients = GetIngredientInRecipeSerializer(
@@ -207,33 +336,96 @@ class GetRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_thumb',
+            'srcset',
+            'image_status',
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
+
+    def get_cache_key(self, recipe):
+        request = self.context.get('request')
+        host = request.get_host() if request else ''
+        return 'recipe:{}:{}:{}:{}:{}'.format(
+            get_cache_version('tags'),
+            get_cache_version('ingredients'),
+            host,
+            recipe.pk,
+            recipe.updated_at.timestamp(),
+        )
+
+    def get_shared_representations(self, recipes):
+        keys = [self.get_cache_key(recipe) for recipe in recipes]
+        # Без общего кэша правка тега в одном воркере не сбросит
+        # представления рецептов в других.
+        cached = cache.get_many(keys) if settings.SHARED_CACHE else {}
+        missing = [
+            recipe for recipe, key in zip(recipes, keys) if key not in cached
+        ]
+        if missing:
+            prefetch_related_objects(missing, *RECIPE_PREFETCH)
+            rendered = {}
+            for recipe in missing:
+                recipe.author.is_subscribed = self.get_is_author_subscribed(
+                    recipe
+                )
+                rendered[self.get_cache_key(recipe)] = (
+                    super().to_representation(recipe)
+                )
+            if settings.SHARED_CACHE:
+                cache.set_many(rendered, settings.RECIPE_CACHE_TIMEOUT)
+            cached.update(rendered)
+        return [cached[key] for key in keys]
+
+    def add_viewer_fields(self, recipe, representation):
+        representation = dict(representation)
+        representation['is_favorited'] = self.get_is_favorited(recipe)
+        representation['is_in_shopping_cart'] = self.get_is_in_basket(recipe)
+        representation['author'] = dict(
+            representation['author'],
+            is_subscribed=self.get_is_author_subscribed(recipe)
+        )
+        return self.add_image_fields(recipe, representation)
+
+    def get_is_author_subscribed(self, recipe):
+        if hasattr(recipe, 'author_subscribed'):
+            return recipe.author_subscribed
+        return self.fields['author'].get_is_subscribed(recipe.author)
+
+    def to_representation(self, instance):
+        return self.add_viewer_fields(
+            instance, self.get_shared_representations([instance])[0]
+        )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
         return FavoriteRecipe.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_basket(self, obj):
+        if hasattr(obj, 'in_shopping_cart'):
+            return obj.in_shopping_cart
         user = self.context['request'].user
         if not user.is_authenticated:
             return False
         return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
 
-class CreateRecipeSerializer(serializers.ModelSerializer):
+class CreateRecipeSerializer(RecipeImageSerializer,
+                             serializers.ModelSerializer):
     """Сериализатор создания рецепта."""
     ingredients = CreateIngredientInRecipeSerializer(
         many=True, required=True, source='ingredientinrecipe_set'
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all()
     )
     author = UserSerializer(read_only=True)
-    image = Base64ImageField(max_length=None, use_url=True)
+    image = QueuedBase64ImageField(use_url=True)
 
     class Meta:
         model = Recipe
@@ -244,14 +436,70 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_thumb',
+            'srcset',
+            'image_status',
             'text',
             'cooking_time',
         )
-
+        read_only_fields = ('image_status',)
+
+    def resolve_ids(self, model, ids, errors, field, verbose_name):
+        """Достает объекты по id одним запросом, копя ошибки в errors."""
+        objects = model.objects.in_bulk(set(ids))
+        missing = sorted(set(ids) - set(objects))
+        duplicates = sorted(pk for pk, total in Counter(ids).items()
+                            if total > 1)
+        if missing:
+            errors.setdefault(field, []).append(
+                f'{verbose_name} не найдены: '
+                f'{", ".join(map(str, missing))}'
+            )
+        if duplicates:
+            errors.setdefault(field, []).append(
+                f'{verbose_name} повторяются: '
+                f'{", ".join(map(str, duplicates))}'
+            )
+        return objects
+
+    def validate(self, data):
+        errors = {}
+        ingredients_data = data.get('ingredientinrecipe_set')
+        if ingredients_data is not None:
+            ingredients = self.resolve_ids(
+                Ingredient,
+                [item['ingredients'] for item in ingredients_data],
+                errors, 'ingredients', 'Ингредиенты'
+            )
+        if 'tags' in data:
+            tags = self.resolve_ids(
+                Tag, data['tags'], errors, 'tags', 'Теги'
+            )
+        if errors:
+            raise ValidationError(errors)
+        if ingredients_data is not None:
+            for item in ingredients_data:
+                item['ingredients'] = ingredients[item['ingredients']]
+        if 'tags' in data:
+            data['tags'] = [tags[pk] for pk in data['tags']]
+        return data
+
+    def to_representation(self, instance):
+        prefetch_related_objects([instance], *RECIPE_PREFETCH)
+        return super().to_representation(instance)
+
+    @transaction.atomic
     def create(self, validated_data):
         tag_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredientinrecipe_set')
+        image = validated_data.pop('image')
         recipe = Recipe.objects.create(**validated_data)
+        enqueue_image(recipe, image)
+        enqueue_fanout(recipe)
+        enqueue_similar(recipe)
+        User.objects.filter(pk=recipe.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
         recipe.tags.set(tag_data)
         IngredientInRecipe.objects.bulk_create(
             IngredientInRecipe(
@@ -261,24 +509,54 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             ) for ingredient in ingredients_data)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """Меняет только добавленные, удаленные и измененные строки."""
+        amounts = {
+            item['ingredients'].pk: int(item['amount'])
+            for item in ingredients_data
+        }
+        existing = {}
+        to_delete = []
+        for row in IngredientInRecipe.objects.filter(recipe=recipe):
+            if row.ingredients_id in amounts and (
+                    row.ingredients_id not in existing):
+                existing[row.ingredients_id] = row
+            else:
+                to_delete.append(row.pk)
+        to_update = []
+        for ingredient_id, row in existing.items():
+            if row.amount != amounts[ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                to_update.append(row)
+        to_create = [
+            IngredientInRecipe(
+                recipe=recipe, ingredients_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        if to_delete:
+            IngredientInRecipe.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            IngredientInRecipe.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            IngredientInRecipe.objects.bulk_create(to_create)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
+        if ('ingredientinrecipe_set' in validated_data
+                or 'tags' in validated_data):
+            enqueue_similar(instance)
         if 'ingredientinrecipe_set' in validated_data:
-            instance.ingredients.all().delete()
-            ingredients_data = validated_data.get('ingredientinrecipe_set')
-            IngredientInRecipe.objects.bulk_create(
-                IngredientInRecipe(
-                    recipe=instance,
-                    ingredients=ingredient.get('ingredients'),
-                    amount=int(ingredient.pop('amount'))
-                ) for ingredient in ingredients_data)
-
+            self.update_ingredients(
+                instance, validated_data.pop('ingredientinrecipe_set')
+            )
         if 'tags' in validated_data:
-            instance.tags.set(validated_data['tags'])
-
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time)
-        instance.image = validated_data.get('image', instance.image)
+            instance.tags.set(validated_data.pop('tags'))
+        if 'image' in validated_data:
+            enqueue_image(instance, validated_data.pop('image'))
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
 
         return instance
@@ -0,0 +1,68 @@
+import csv
+import io
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+TITLE = 'Список покупок:'
+PDF_FONT = 'ShoppingCartFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+
+
+class Echo:
+    """Псевдо-файл, отдающий записанную строку вместо её буферизации."""
+    def write(self, value):
+        return value
+
+
+def txt_lines(items):
+    yield f'{TITLE}\n\n'
+    for item in items:
+        name = item['ingredients__name'].capitalize()
+        measurement_unit = item['ingredients__measurement_unit']
+        yield f'{name} ({measurement_unit}) — {item["amount"]};\n'
+
+
+def csv_lines(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for item in items:
+        yield writer.writerow((
+            item['ingredients__name'].capitalize(),
+            item['ingredients__measurement_unit'],
+            item['amount'],
+        ))
+
+
+def pdf_lines(items):
+    """PDF нельзя отдавать по частям: таблица ссылок пишется в конце."""
+    if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT, settings.SHOPPING_CART_PDF_FONT)
+        )
+    buffer = io.BytesIO()
+    page = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    y = height - PDF_MARGIN
+    page.setFont(PDF_FONT, PDF_FONT_SIZE)
+    for line in txt_lines(items):
+        if y < PDF_MARGIN:
+            page.showPage()
+            page.setFont(PDF_FONT, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        page.drawString(PDF_MARGIN, y, line.strip())
+        y -= PDF_LINE_HEIGHT
+    page.save()
+    yield buffer.getvalue()
+
+
+FILE_FORMATS = {
+    'txt': (txt_lines, 'text/plain; charset=utf-8'),
+    'csv': (csv_lines, 'text/csv; charset=utf-8'),
+    'pdf': (pdf_lines, 'application/pdf'),
+}
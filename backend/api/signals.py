@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import Ingredient, Recipe, SimilarRecipe, Tag
+from recipes.similar import enqueue_similar_ids
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+from . import metrics
+from .authentication import invalidate_tokens
+from .cache import invalidate_cache
+from .cookable import recipe_ingredient_index
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    invalidate_cache('ingredients')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(**kwargs):
+    invalidate_cache('tags')
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_ingredient_index(instance, **kwargs):
+    """Ингредиенты пишутся после рецепта, поэтому читаем их после коммита."""
+    recipe_id = instance.pk
+    transaction.on_commit(
+        lambda: recipe_ingredient_index.update([recipe_id])
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def discard_recipe_ingredients(instance, **kwargs):
+    recipe_ingredient_index.discard([instance.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_similar_neighbours(instance, **kwargs):
+    """Строки SimilarRecipe удаляются каскадом раньше post_delete."""
+    instance.similar_neighbour_ids = list(
+        SimilarRecipe.objects.filter(similar=instance)
+        .values_list('recipe_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def enqueue_similar_neighbours(instance, **kwargs):
+    """Рецептам, у которых пропал похожий, нужен следующий по сходству."""
+    neighbour_ids = getattr(instance, 'similar_neighbour_ids', None)
+    if neighbour_ids:
+        enqueue_similar_ids(neighbour_ids)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields, **kwargs):
+    """Профиль автора входит в кэшированное представление его рецептов."""
+    if created or update_fields == frozenset(('last_login',)):
+        return
+    Recipe.objects.filter(author=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, **kwargs):
+    """В кэше токенов лежит пользователь со старым паролем и статусом."""
+    if not created:
+        invalidate_tokens(
+            Token.objects.filter(user=instance).values_list('key', flat=True)
+        )
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(request_started)
+def check_connections(**kwargs):
+    """Закрывает постоянное соединение, которое база уже разорвала.
+
+    Идет после close_old_connections Django. Проверяются только открытые
+    соединения, новое Django откроет лениво при первом запросе к базе.
+    """
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+@receiver(connection_created)
+def count_connection(**kwargs):
+    """Django открывает соединение лениво, при первом запросе к базе.
+
+    Старше CONN_MAX_AGE закрывает close_old_connections, разорванные
+    базой — check_connections. Время установки пишет foodgram.db.
+    """
+    metrics.increment('db_connections_total')
@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache_key
+from users.models import User
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Reader', last_name='Test', password='password123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def delete_token_elsewhere(self):
+        """Токен удален в другом воркере: запись в этом кэше осталась."""
+        cache.set(token_cache_key(self.token.key), self.user)
+        Token.objects.filter(pk=self.token.pk).delete()
+
+    def test_local_cache_checks_token_in_database(self):
+        self.delete_token_elsewhere()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_shared_cache_is_used(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.assertEqual(
+            cache.get(token_cache_key(self.token.key)), self.user
+        )
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
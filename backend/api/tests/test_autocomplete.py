@@ -0,0 +1,26 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.autocomplete import IngredientIndex
+from api.cache import invalidate_cache
+from recipes.models import Ingredient
+
+
+class IngredientIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.create(name='Молоко', measurement_unit='мл')
+
+    def names(self, index, name):
+        return [item['name'] for item in index.search(name)]
+
+    def test_rebuilds_on_version_from_other_process(self):
+        index = IngredientIndex()
+        index.build()
+        # Форкнутый воркер со старой копией: версию сменил другой процесс.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Мука', measurement_unit='г')]
+        )
+        self.assertEqual(self.names(index, 'м'), ['Молоко'])
+        invalidate_cache('ingredients')
+        self.assertEqual(self.names(index, 'м'), ['Молоко', 'Мука'])
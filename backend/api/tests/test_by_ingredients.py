@@ -0,0 +1,64 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.cookable import recipe_ingredient_index
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+from users.models import User
+
+URL = '/api/recipes/by_ingredients/'
+
+
+class ByIngredientsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Test', password='password123',
+        )
+        cls.flour, cls.milk, cls.eggs = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('мука', 'молоко', 'яйца')
+        )
+        cls.pancakes = Recipe.objects.create(
+            author=author, name='Блины', text='Текст', cooking_time=10,
+            image='recipes/test.jpg',
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=cls.pancakes, ingredients=ingredient, amount=100
+            )
+            for ingredient in (cls.flour, cls.milk, cls.eggs)
+        )
+
+    def setUp(self):
+        recipe_ingredient_index.build()
+        self.client = APIClient()
+
+    def test_coverage(self):
+        response = self.client.get(
+            URL, {'ingredients': [self.flour.pk, self.milk.pk]}
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe, = response.data['results']
+        self.assertEqual(recipe['id'], self.pancakes.pk)
+        self.assertEqual(recipe['coverage'], 0.667)
+        self.assertEqual(recipe['missing_count'], 1)
+
+    def test_invalid_ids(self):
+        for value in ('', 'abc', '0', '-1', '1.5', '²',
+                      '99999999999999999999', str(2 ** 63)):
+            with self.subTest(value=value):
+                response = self.client.get(URL, {'ingredients': value})
+                self.assertEqual(response.status_code, 400)
+
+    def test_largest_id(self):
+        response = self.client.get(URL, {'ingredients': str(2 ** 63 - 1)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    @override_settings(BY_INGREDIENTS_MAX=2)
+    def test_too_many_ids(self):
+        response = self.client.get(
+            URL, {'ingredients': [self.flour.pk, self.milk.pk, self.eggs.pk]}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,80 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.feed import (enqueue_fanout, process_feed_tasks,
+                          process_prune_tasks)
+from recipes.models import FeedEntry, Recipe
+from users.models import User
+
+
+class FeedUnfollowTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.other = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name='Test', password='password123',
+            )
+            for name in ('reader', 'author', 'other')
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def subscribe(self, author, method='post'):
+        return getattr(self.client, method)(
+            f'/api/users/{author.pk}/subscribe/'
+        )
+
+    def follow_with_recipes(self):
+        for author in (self.author, self.other):
+            self.assertEqual(self.subscribe(author).status_code, 201)
+            for number in range(2):
+                enqueue_fanout(Recipe.objects.create(
+                    author=author, name=f'Рецепт {number}', text='Текст',
+                    cooking_time=10, image='recipes/test.jpg',
+                ))
+        process_feed_tasks(10)
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 4)
+
+    def test_unfollow_removes_only_that_author(self):
+        self.follow_with_recipes()
+
+        self.assertEqual(
+            self.subscribe(self.author, 'delete').status_code, 204
+        )
+        self.assertEqual(process_prune_tasks(10), (1, 2))
+
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.user)
+                .values_list('author_id', flat=True)),
+            {self.other.pk},
+        )
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(
+            {recipe['author']['id'] for recipe in response.data['results']},
+            {self.other.pk},
+        )
+
+    def test_resubscribe_before_prune_keeps_entries(self):
+        self.follow_with_recipes()
+        self.subscribe(self.author, 'delete')
+        self.assertEqual(self.subscribe(self.author).status_code, 201)
+
+        self.assertEqual(process_prune_tasks(10), (1, 0))
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 4)
+
+    def test_invalid_cursor_and_limit(self):
+        for cursor in ('²', 'abc', str(2 ** 70), '0'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    '/api/recipes/feed/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 400)
+        for limit in ('²', str(2 ** 70), '-1'):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    '/api/recipes/feed/', {'limit': limit}
+                )
+                self.assertEqual(response.status_code, 200)
@@ -0,0 +1,167 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+
+from api.filters import RecipeFilter
+from api.views import RecipeViewSet
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart, Tag
+from users.models import User
+
+
+class RecipeFilterMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Reader', last_name='Test', password='password123',
+        )
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Test', password='password123',
+        )
+        cls.breakfast, cls.lunch, cls.dinner = (
+            Tag.objects.create(name=name, color=f'#00000{number}', slug=slug)
+            for number, (name, slug) in enumerate((
+                ('Завтрак', 'breakfast'), ('Обед', 'lunch'),
+                ('Ужин', 'dinner'),
+            ))
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author if number % 2 else cls.user,
+                name=f'Рецепт {number}', text='Текст', cooking_time=10,
+                image='recipes/test.jpg',
+            )
+            for number in range(4)
+        ]
+        first, second, third, _ = cls.recipes
+        first.tags.set((cls.breakfast,))
+        second.tags.set((cls.breakfast, cls.lunch))
+        third.tags.set((cls.lunch,))
+        FavoriteRecipe.objects.create(user=cls.user, recipe=first)
+        FavoriteRecipe.objects.create(user=cls.user, recipe=third)
+        FavoriteRecipe.objects.create(user=cls.author, recipe=second)
+        ShoppingCart.objects.create(user=cls.user, recipe=second)
+        ShoppingCart.objects.create(user=cls.author, recipe=third)
+
+    def filter_queryset(self, params, user=None):
+        request = RequestFactory().get('/api/recipes/', params)
+        request.user = user or AnonymousUser()
+        queryset = RecipeViewSet(request=request).get_queryset()
+        return RecipeFilter(request.GET, queryset, request=request).qs
+
+
+class RecipeFilterTest(RecipeFilterMixin, TestCase):
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, client, params):
+        response = client.get('/api/recipes/', dict(params, limit=100))
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def ids(self, *indexes):
+        return [self.recipes[index].pk for index in sorted(indexes)[::-1]]
+
+    def test_tags(self):
+        cases = (
+            ({'tags': 'breakfast'}, self.ids(0, 1)),
+            ({'tags': ['breakfast', 'lunch']}, self.ids(0, 1, 2)),
+            ({'tags': 'dinner'}, []),
+            ({'tags': 'unknown'}, []),
+        )
+        for params, expected in cases:
+            with self.subTest(params=params):
+                self.assertEqual(self.get_ids(self.anonymous, params), expected)
+
+    def test_is_favorited(self):
+        self.assertEqual(
+            self.get_ids(self.client, {'is_favorited': 1}), self.ids(0, 2)
+        )
+        self.assertEqual(
+            self.get_ids(self.client, {'is_favorited': 0}), self.ids(1, 3)
+        )
+
+    def test_is_in_shopping_cart(self):
+        self.assertEqual(
+            self.get_ids(self.client, {'is_in_shopping_cart': 1}),
+            self.ids(1),
+        )
+        self.assertEqual(
+            self.get_ids(self.client, {'is_in_shopping_cart': 0}),
+            self.ids(0, 2, 3),
+        )
+
+    def test_anonymous_user_lists(self):
+        for name in ('is_favorited', 'is_in_shopping_cart'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get_ids(self.anonymous, {name: 1}), [])
+                self.assertEqual(
+                    self.get_ids(self.anonymous, {name: 0}),
+                    self.ids(0, 1, 2, 3),
+                )
+
+    def test_combined(self):
+        self.assertEqual(
+            self.get_ids(self.client, {
+                'is_favorited': 1, 'tags': 'lunch', 'author': self.author.pk,
+            }),
+            [],
+        )
+        self.assertEqual(
+            self.get_ids(self.client, {'is_favorited': 1, 'tags': 'lunch'}),
+            self.ids(2),
+        )
+
+    def test_author(self):
+        self.assertEqual(
+            self.get_ids(self.anonymous, {'author': self.author.pk}),
+            self.ids(1, 3),
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN только на PostgreSQL')
+class RecipeFilterPlanTest(RecipeFilterMixin, TestCase):
+    """Фильтры должны идти по индексам, а не по всей таблице связей."""
+    def explain(self, params):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return self.filter_queryset(params, self.user).explain()
+
+    def index_names(self, table, column):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, table
+            )
+        return [
+            name for name, constraint in constraints.items()
+            if constraint['index'] and constraint['columns'][0] == column
+        ]
+
+    def assert_uses_index(self, plan, names):
+        self.assertTrue(
+            any(name in plan for name in names),
+            f'Нет индекса из {names} в плане:\n{plan}',
+        )
+
+    def test_tags(self):
+        self.assert_uses_index(
+            self.explain({'tags': ['breakfast', 'lunch']}),
+            self.index_names(Recipe.tags.through._meta.db_table, 'recipe_id'),
+        )
+
+    def test_is_favorited(self):
+        self.assert_uses_index(
+            self.explain({'is_favorited': 1}), ['unique_favorite_recipe']
+        )
+
+    def test_is_in_shopping_cart(self):
+        self.assert_uses_index(
+            self.explain({'is_in_shopping_cart': 1}),
+            ['unique_shopping_cart_recipe'],
+        )
@@ -0,0 +1,143 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.images import claim_tasks, enqueue_image, process_image_task
+from recipes.models import ImageTask, Recipe
+from users.models import User
+
+
+class ImageTaskTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Test', password='password123',
+        )
+        self.recipe = self.create_recipe(
+            image='recipes/test.jpg', image_status=Recipe.IMAGE_PENDING,
+        )
+        self.client = APIClient()
+
+    def create_recipe(self, **kwargs):
+        return Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст', cooking_time=10,
+            **kwargs
+        )
+
+    def test_failed_image_refreshes_cached_recipe(self):
+        path = f'/api/recipes/{self.recipe.pk}/'
+        self.assertEqual(
+            self.client.get(path).data['image_status'], Recipe.IMAGE_PENDING
+        )
+        task = ImageTask.objects.create(
+            recipe=self.recipe,
+            source=ContentFile(b'not an image', name='broken.png'),
+        )
+
+        for attempt in range(1, settings.RECIPE_IMAGE_MAX_ATTEMPTS + 1):
+            self.assertEqual(claim_tasks(10, stale_after=60), [task.pk])
+            self.assertFalse(process_image_task(task.pk))
+            task.refresh_from_db()
+            self.assertEqual(task.attempts, attempt)
+            if attempt < settings.RECIPE_IMAGE_MAX_ATTEMPTS:
+                self.assertEqual(task.status, ImageTask.PENDING)
+                self.assertEqual(
+                    self.client.get(path).data['image_status'],
+                    Recipe.IMAGE_PENDING,
+                )
+
+        self.assertEqual(task.status, ImageTask.FAILED)
+        self.assertEqual(claim_tasks(10, stale_after=60), [])
+        self.assertEqual(
+            self.client.get(path).data['image_status'], Recipe.IMAGE_FAILED
+        )
+
+    def test_original_is_kept_next_to_renditions(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (2000, 1000), '#E26C2D').save(buffer, 'PNG')
+        task = ImageTask.objects.create(
+            recipe=self.recipe,
+            source=ContentFile(buffer.getvalue(), name='photo.png'),
+        )
+        source = task.source.name
+
+        self.assertTrue(process_image_task(task.pk))
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, source)
+        self.assertTrue(default_storage.exists(source))
+        directory = f'recipes/{self.recipe.pk}/'
+        self.assertTrue(source.startswith(directory))
+        for sizes in self.recipe.image_renditions.values():
+            for name in sizes.values():
+                self.assertTrue(name.startswith(directory))
+                self.assertTrue(default_storage.exists(name))
+        for width in ('²', 'abc', str(2 ** 70)):
+            with self.subTest(width=width):
+                response = self.client.get(
+                    f'/api/recipes/{self.recipe.pk}/', {'image_width': width}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('_320.jpg', response.data['image_thumb'])
+
+    def test_original_is_served_while_pending(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), '#E26C2D').save(buffer, 'PNG')
+        enqueue_image(self.recipe, ContentFile(buffer.getvalue(), 'new.png'))
+
+        data = self.client.get(f'/api/recipes/{self.recipe.pk}/').data
+        self.assertEqual(data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertTrue(data['image'].endswith(
+            f'recipes/{self.recipe.pk}/new.png'
+        ))
+        self.assertEqual(data['image_thumb'], data['image'])
+
+    def test_backfill_queues_only_legacy_images(self):
+        legacy = self.create_recipe(image='recipes/legacy.jpg')
+        queued = self.create_recipe(image='recipes/queued.jpg')
+        ImageTask.objects.create(recipe=queued, source='recipes/queued.jpg')
+        self.create_recipe(
+            image='recipes/ready.jpg',
+            image_renditions={'jpeg': {'320': 'recipes/ready_320.jpg'}},
+        )
+        self.create_recipe(image='')
+
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ImageTask.objects.count(), 1)
+
+        call_command('backfill_renditions', '--batch-size', '1',
+                     stdout=io.StringIO())
+        call_command('backfill_renditions', stdout=io.StringIO())
+
+        self.assertEqual(
+            sorted(ImageTask.objects.values_list('recipe_id', flat=True)),
+            [legacy.pk, queued.pk],
+        )
+        self.assertEqual(
+            ImageTask.objects.get(recipe=legacy).source.name,
+            'recipes/legacy.jpg',
+        )
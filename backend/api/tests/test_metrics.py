@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from api import metrics, signals
+from api.views import metrics_view
+
+
+class MetricsViewTest(SimpleTestCase):
+    def get(self, **headers):
+        return metrics_view(RequestFactory().get('/metrics', **headers))
+
+    def test_not_routed_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(
+            self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403
+        )
+        response = self.get(HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_denies(self):
+        self.assertEqual(
+            self.get(HTTP_AUTHORIZATION='Bearer ').status_code, 403
+        )
+
+
+class MultiprocessMetricsTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def write_worker(self, pid, requests):
+        metrics.reset()
+        metrics.increment('requests_total', requests)
+        metrics.observe('http_request_queries', {'view': 'list'}, 3)
+        metrics.write_json(
+            os.path.join(self.directory, f'{pid}.json'), metrics.snapshot()
+        )
+        metrics.reset()
+
+    def test_collects_other_and_dead_workers(self):
+        with override_settings(METRICS_MULTIPROC_DIR=self.directory):
+            self.write_worker(1, 2)
+            self.write_worker(2, 3)
+            metrics.mark_process_dead(self.directory, 1)
+            metrics.increment('requests_total')
+            metrics.flush(force=True)
+
+            counters, histograms = metrics.collect()
+
+        self.assertEqual(counters['requests_total'], 6)
+        _, total, count = histograms[
+            ('http_request_queries', (('view', 'list'),))
+        ]
+        self.assertEqual((total, count), (6, 2))
+        self.assertEqual(
+            set(os.listdir(self.directory)),
+            {'2.json', f'{os.getpid()}.json', metrics.ARCHIVE_FILE},
+        )
+
+
+class ConnectionHealthCheckTest(SimpleTestCase):
+    def connection(self, opened, usable):
+        return mock.Mock(
+            connection=object() if opened else None,
+            is_usable=mock.Mock(return_value=usable),
+        )
+
+    def test_closes_only_broken_open_connections(self):
+        broken = self.connection(opened=True, usable=False)
+        alive = self.connection(opened=True, usable=True)
+        closed = self.connection(opened=False, usable=False)
+        with mock.patch.object(
+                signals.connections, 'all',
+                return_value=[broken, alive, closed]):
+            signals.check_connections()
+            with override_settings(DB_CONN_HEALTH_CHECKS=False):
+                signals.check_connections()
+        broken.close.assert_called_once_with()
+        alive.close.assert_not_called()
+        closed.is_usable.assert_not_called()
+        closed.close.assert_not_called()
@@ -0,0 +1,110 @@
+from urllib.parse import parse_qs, urlparse
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import Follow, User
+
+
+class CursorOrderingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='User', last_name=str(number),
+                password='password123',
+            )
+            for number in range(5)
+        ]
+        cls.user = cls.users[0]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.users[number % 2 + 1], name=f'Суп {number}',
+                text='Текст', cooking_time=10, image='recipes/test.jpg',
+            )
+            for number in range(5)
+        ]
+        for author in cls.users[1:]:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, params):
+        ids = []
+        params = dict(params, pagination='cursor', limit=2)
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+            params = {}
+        return ids
+
+    def test_cursor_rejects_ranked_orderings(self):
+        for params in ({'ordering': 'trending'}, {'search': 'суп'}):
+            with self.subTest(params=params):
+                response = self.client.get(
+                    '/api/recipes/', dict(params, pagination='cursor')
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('pagination', response.data)
+
+    def test_cursor_keeps_queryset_order(self):
+        self.assertEqual(
+            self.walk('/api/recipes/', {}),
+            sorted((recipe.pk for recipe in self.recipes), reverse=True),
+        )
+        self.assertEqual(
+            self.walk('/api/users/subscriptions/', {}),
+            [user.pk for user in sorted(
+                self.users[1:], key=lambda user: user.username
+            )],
+        )
+        next_url = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'limit': 2}
+        ).data['next']
+        self.assertIn('cursor', parse_qs(urlparse(next_url).query))
+
+
+@override_settings(PAGINATION_COUNT_LIMIT=12)
+class CappedCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Test', password='password123',
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image='recipes/test.jpg',
+            )
+            for number in range(30)
+        )
+
+    def get(self, **params):
+        return self.client.get('/api/recipes/', dict(params, limit=5))
+
+    def test_pages_beyond_capped_count(self):
+        for page, has_next in ((2, True), (4, True), (6, False)):
+            with self.subTest(page=page):
+                response = self.get(page=page)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['count'], 12)
+                self.assertEqual(len(response.data['results']), 5)
+                self.assertEqual(response.data['next'] is not None, has_next)
+        self.assertEqual(self.get(page=7).status_code, 404)
+
+    def test_invalid_page_numbers(self):
+        for page in ('²', 'abc', '0', str(2 ** 70)):
+            for count in ('0', '1'):
+                with self.subTest(page=page, count=count):
+                    self.assertEqual(
+                        self.get(page=page, count=count).status_code, 404
+                    )
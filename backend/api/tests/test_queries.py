@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingCart, Tag)
+from users.models import Follow, User
+
+RENDITIONS = {
+    'jpeg': {'320': 'recipes/test_320.jpg'},
+    'webp': {'320': 'recipes/test_320.webp'},
+}
+
+
+class QueryCountMixin:
+    """Число запросов страницы не должно зависеть от ее размера."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Reader', last_name='Test', password='password123',
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                first_name='Author', last_name=str(number),
+                password='password123',
+            )
+            for number in range(25)
+        ]
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(5)
+        ]
+        for number, author in enumerate(cls.authors * 2):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=10, image='recipes/test.jpg',
+                image_renditions=RENDITIONS,
+            )
+            recipe.tags.set(tags)
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(
+                    recipe=recipe, ingredients=ingredient, amount=10
+                )
+                for ingredient in ingredients
+            )
+            if number % 2:
+                FavoriteRecipe.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_page_queries(self, client, url, expected):
+        for limit in (1, 6, 20):
+            cache.clear()
+            with self.subTest(url=url, limit=limit):
+                with self.assertNumQueries(expected):
+                    response = client.get(url, {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), limit)
+
+
+class RecipeListQueriesTest(QueryCountMixin, TestCase):
+    def test_anonymous(self):
+        self.assert_page_queries(self.anonymous, '/api/recipes/', 4)
+
+    def test_authenticated(self):
+        self.assert_page_queries(self.client, '/api/recipes/', 4)
+
+
+class SubscriptionsQueriesTest(QueryCountMixin, TestCase):
+    def test_subscriptions(self):
+        self.assert_page_queries(
+            self.client, '/api/users/subscriptions/', 3
+        )
+
+    def test_latest_recipes(self):
+        response = self.client.get(
+            '/api/users/subscriptions/', {'limit': 3, 'recipes_limit': 1}
+        )
+        for author in response.data['results']:
+            self.assertEqual(
+                [recipe['id'] for recipe in author['recipes']],
+                list(
+                    Recipe.objects.filter(author_id=author['id'])
+                    .values_list('id', flat=True)[:1]
+                ),
+            )
+
+    def test_invalid_recipes_limit(self):
+        for value in ('many', '-1', '²', str(2 ** 63)):
+            with self.subTest(value=value):
+                response = self.client.get(
+                    '/api/users/subscriptions/', {'recipes_limit': value}
+                )
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,96 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            SimilarityTask, SimilarRecipe)
+from recipes.similar import Features, compute_all, process_similarity_tasks
+from users.models import User
+
+
+class SimilarQueueTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Test', password='password123',
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(12)
+        ]
+        cls.recipes = [
+            cls.create_recipe(number, range(number, number + 4))
+            for number in range(8)
+        ]
+
+    @classmethod
+    def create_recipe(cls, number, ingredient_numbers):
+        recipe = Recipe.objects.create(
+            author=cls.author, name=f'Рецепт {number}', text='Текст',
+            cooking_time=10, image='recipes/test.jpg',
+        )
+        cls.set_ingredients(recipe, ingredient_numbers)
+        return recipe
+
+    @classmethod
+    def set_ingredients(cls, recipe, ingredient_numbers):
+        IngredientInRecipe.objects.filter(recipe=recipe).delete()
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe, ingredients=cls.ingredients[number],
+                amount=10,
+            )
+            for number in ingredient_numbers
+        )
+
+    def setUp(self):
+        cache.clear()
+        list(compute_all(Features(top_k=3)))
+
+    def snapshot(self):
+        return {
+            (recipe_id, similar_id): round(score, 5)
+            for recipe_id, similar_id, score in SimilarRecipe.objects
+            .values_list('recipe_id', 'similar_id', 'score')
+        }
+
+    def process_queue(self):
+        while process_similarity_tasks(10, top_k=3)[0]:
+            pass
+        self.assertFalse(SimilarityTask.objects.exists())
+
+    def assert_matches_full_compute(self):
+        incremental = self.snapshot()
+        list(compute_all(Features(top_k=3)))
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_changed_recipe(self):
+        recipe = self.recipes[0]
+        self.set_ingredients(recipe, (6, 7, 8, 9))
+        SimilarityTask.objects.create(recipe=recipe)
+        self.process_queue()
+        self.assert_matches_full_compute()
+
+    def test_deleted_recipe_requeues_neighbours(self):
+        deleted = self.recipes[3]
+        neighbours = set(
+            SimilarRecipe.objects.filter(similar=deleted)
+            .values_list('recipe_id', flat=True)
+        )
+        self.assertTrue(neighbours)
+        deleted.delete()
+        self.assertEqual(
+            set(SimilarityTask.objects.values_list('recipe_id', flat=True)),
+            neighbours,
+        )
+        self.process_queue()
+        self.assert_matches_full_compute()
+
+    def test_invalid_pk_is_not_found(self):
+        for pk in ('abc', '²', str(2 ** 64), '0'):
+            with self.subTest(pk=pk):
+                response = self.client.get(f'/api/recipes/{pk}/similar/')
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get(f'/api/recipes/{self.recipes[0].pk}/similar/')
+        self.assertEqual(response.status_code, 200)
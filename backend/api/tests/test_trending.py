@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import FavoriteRecipe, Recipe, TrendingRecipe
+from recipes.trending import refresh
+from users.models import User
+
+
+class TrendingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='User', last_name=str(number),
+                password='password123',
+            )
+            for number in range(3)
+        ]
+        cls.user = cls.users[0]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.users[1], name=f'Суп {number}', text='Текст',
+                cooking_time=10, image='recipes/test.jpg',
+            )
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_undated_favorites_are_not_trending(self):
+        old, new = self.recipes[:2]
+        FavoriteRecipe.objects.bulk_create(
+            FavoriteRecipe(user=user, recipe=old, created_at=None)
+            for user in self.users
+        )
+        response = self.client.post(f'/api/recipes/{new.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        refresh(full=True)
+        self.assertEqual(
+            list(TrendingRecipe.objects.values_list('recipe_id', flat=True)),
+            [new.pk],
+        )
+
+        response = self.client.delete(f'/api/recipes/{old.pk}/favorite/')
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get('/api/recipes/', {'ordering': 'trending'})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [new.pk]
+        )
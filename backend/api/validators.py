@@ -0,0 +1,9 @@
+# Наибольшее значение первичного ключа (bigint в PostgreSQL).
+MAX_ID = 2 ** 63 - 1
+
+
+def is_valid_id(value):
+    """Строка с положительным целым, которое помещается в bigint."""
+    return (
+        value.isascii() and value.isdigit() and 0 < int(value) <= MAX_ID
+    )
@@ -1,23 +1,42 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import hmac
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import BooleanField, Exists, F, OuterRef, Sum, Value
+from django.db.models.expressions import RawSQL
+from django.http import (Http404, HttpResponse, HttpResponseForbidden,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.validators import ValidationError
 
-from recipes.models import (FavoriteRecipe, Ingredient, Recipe, ShoppingCart,
-                            Tag)
+from recipes.feed import backfill_feed, enqueue_prune, feed_recipe_ids
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
+                            Recipe, ShoppingCart, SimilarRecipe, Tag)
+from recipes.trending import add_event
 from users.models import Follow, User
 
-from .filters import IngredientFilter
-from .pagination import CustomPagination
+from . import metrics
+from .autocomplete import ingredient_index
+from .cache import CachedResponseMixin, etag_response, make_etag
+from .cookable import recipe_ingredient_index
+from .filters import IngredientFilter, RecipeFilter
+from .pagination import (CustomPagination, FeedPagination,
+                         SequencePagination)
 from .permissions import CustomUserPermissions, IsAuthor, IsAuthorOrReadOnly
 from .serializers import (CreateRecipeSerializer, FollowSerializer,
                           GetRecipeSerializer, IngredientSerializer,
                           PasswordSerializer, RecipeFavoriteSerializer,
                           TagSerializer, UserSerializer)
+from .shopping_cart import FILE_FORMATS
+from .validators import MAX_ID, is_valid_id
+
+RECIPES_LIMIT = 6
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -27,6 +46,70 @@ class UserViewSet(viewsets.ModelViewSet):
     permission_classes = (CustomUserPermissions,)
     http_method_names = ['get', 'post', 'delete']
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        Recipe.objects.filter(
+            favoriterecipe__user=instance, favorites_count__gt=0
+        ).update(favorites_count=F('favorites_count') - 1)
+        User.objects.filter(
+            following__user=instance, followers_count__gt=0
+        ).update(followers_count=F('followers_count') - 1)
+        instance.delete()
+
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return RECIPES_LIMIT
+        if not (recipes_limit.isascii() and recipes_limit.isdigit()
+                and int(recipes_limit) <= MAX_ID):
+            raise ValidationError(
+                {'recipes_limit': ['Укажите целое неотрицательное число']}
+            )
+        return int(recipes_limit)
+
+    def get_follow_queryset(self):
+        """Авторы с числом рецептов и подпиской текущего пользователя."""
+        return User.objects.annotate(
+            is_subscribed=Exists(Follow.objects.filter(
+                user=self.request.user, author=OuterRef('pk')
+            )),
+        ).order_by('username')
+
+    def attach_latest_recipes(self, authors):
+        """Последние рецепты каждого автора одним запросом.
+
+        На PostgreSQL — LATERAL с LIMIT по индексу (author_id, id) для
+        каждого автора, на остальных базах — ROW_NUMBER() по авторам.
+        """
+        authors = list(authors)
+        limit = self.get_recipes_limit()
+        author_ids = [author.pk for author in authors]
+        table = Recipe._meta.db_table
+        if connection.vendor == 'postgresql':
+            sql = (
+                f'SELECT latest.id FROM unnest(%s::integer[]) AS author(id) '
+                f'CROSS JOIN LATERAL (SELECT recipe.id FROM {table} recipe '
+                f'WHERE recipe.author_id = author.id '
+                f'ORDER BY recipe.id DESC LIMIT %s) latest'
+            )
+            params = (author_ids, limit)
+        else:
+            placeholders = ', '.join(['%s'] * len(author_ids)) or 'NULL'
+            sql = (
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY author_id ORDER BY id DESC) AS position '
+                f'FROM {table} WHERE author_id IN ({placeholders})) ranked '
+                f'WHERE position <= %s'
+            )
+            params = (*author_ids, limit)
+        latest = {author_id: [] for author_id in author_ids}
+        for recipe in Recipe.objects.filter(
+                pk__in=RawSQL(sql, params)).defer('search_vector'):
+            latest[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = latest[author.pk]
+        return authors
+
     @action(
         detail=False, methods=['get'],
         url_name='me', url_path='me',
@@ -70,12 +153,40 @@ class UserViewSet(viewsets.ModelViewSet):
                 author, data=request.data, context={'request': request}
             )
             serilalizer.is_valid(raise_exception=True)
-            Follow.objects.create(user=user, author=author)
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=user, author=author)
+                    User.objects.filter(pk=author.pk).update(
+                        followers_count=F('followers_count') + 1
+                    )
+                    backfill_feed(user, author)
+            except IntegrityError:
+                raise ValidationError(
+                    detail={
+                        api_settings.NON_FIELD_ERRORS_KEY:
+                            ['Вы уже подписаны на этого автора']
+                    },
+                    code=status.HTTP_400_BAD_REQUEST
+                )
+            serilalizer = FollowSerializer(
+                self.attach_latest_recipes(
+                    [self.get_follow_queryset().get(pk=author.pk)]
+                )[0],
+                context={'request': request}
+            )
             return Response(serilalizer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            follow = get_object_or_404(Follow, user=user, author=author)
-            self.perform_destroy(follow)
+            with transaction.atomic():
+                deleted, _ = Follow.objects.filter(
+                    user=user, author=author
+                ).delete()
+                if not deleted:
+                    raise Http404
+                enqueue_prune(user, author)
+                User.objects.filter(
+                    pk=author.pk, followers_count__gt=0
+                ).update(followers_count=F('followers_count') - 1)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -84,8 +195,10 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthor,)
     )
     def subscriptions(self, request):
-        follows = User.objects.filter(following__user=self.request.user)
-        paginate_follows = self.paginate_queryset(follows)
+        follows = self.get_follow_queryset().filter(is_subscribed=True)
+        paginate_follows = self.attach_latest_recipes(
+            self.paginate_queryset(follows)
+        )
         serializer = FollowSerializer(
             paginate_follows,
             many=True,
@@ -94,26 +207,45 @@ class UserViewSet(viewsets.ModelViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(mixins.ListModelMixin,
+class TagViewSet(CachedResponseMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_namespace = 'tags'
 
 
-class IngredientViewSet(mixins.ListModelMixin,
+class IngredientViewSet(CachedResponseMixin,
+                        mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         viewsets.GenericViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    cache_namespace = 'ingredients'
+
+    def filter_queryset(self, queryset):
+        """После UNION в filter_name queryset нельзя фильтровать по pk."""
+        if self.action != 'list':
+            return queryset
+        return super().filter_queryset(queryset)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_INDEX_IN_MEMORY:
+            data = ingredient_index.search(name)
+            return etag_response(request, data, make_etag(data))
+        return super().list(request, *args, **kwargs)
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
     http_method_names = ['get', 'post', 'put', 'patch', 'delete']
     pagination_class = CustomPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_class = RecipeFilter
 
     def get_serializer_class(self):
         if self.request.method in ['GET']:
@@ -126,38 +258,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save()
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        User.objects.filter(
+            pk=instance.author_id, recipes_count__gt=0
+        ).update(recipes_count=F('recipes_count') - 1)
+        instance.delete()
+
     def get_queryset(self):
-        queryset = Recipe.objects.all()
         user = self.request.user
-
-        if not self.request.query_params:
-            return queryset
-
-        is_favorited = self.request.query_params.get('is_favorited')
-        if is_favorited == '1':
-            favorited = FavoriteRecipe.objects.filter(user=user)
-            queryset = queryset.filter(favoriterecipe__in=favorited)
-        if is_favorited == '0':
-            favorited = FavoriteRecipe.objects.filter(user=user)
-            queryset = queryset.exclude(favoriterecipe__in=favorited)
-
-        is_in_shopping_cart = self.request.query_params.get('is_in_shopping_cart')
-        if is_in_shopping_cart == '1':
-            shopping_cart = ShoppingCart.objects.filter(user=user)
-            queryset = queryset.filter(shopping_cart__in=shopping_cart)
-        if is_in_shopping_cart == '0':
-            shopping_cart = ShoppingCart.objects.filter(user=user)
-            queryset = queryset.exclude(shopping_cart__in=shopping_cart)
-
-        tags = self.request.query_params.getlist('tags')
-        if tags is not None:
-            slug = Tag.objects.filter(slug__in=tags).all()
-            recipes = Recipe.objects.filter(tags__in=slug).values('id').distinct()
-            queryset = queryset.filter(id__in=recipes)
-
-        author_id = self.request.query_params.get('author')
-        if author_id is not None:
-            queryset = queryset.filter(author_id=author_id).all()
+        queryset = Recipe.objects.select_related('author').defer(
+            'search_vector'
+        )
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                favorited=Exists(FavoriteRecipe.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                author_subscribed=Exists(Follow.objects.filter(
+                    user=user, author=OuterRef('author')
+                )),
+            )
+        else:
+            queryset = queryset.annotate(
+                favorited=Value(False, output_field=BooleanField()),
+                in_shopping_cart=Value(False, output_field=BooleanField()),
+                author_subscribed=Value(False, output_field=BooleanField()),
+            )
 
         return queryset
 
@@ -171,18 +301,46 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, pk=kwargs['pk'])
 
         if request.method == 'POST':
-            if FavoriteRecipe.objects.filter(user=user, recipe=recipe).exists():
+            try:
+                with transaction.atomic():
+                    favorite = FavoriteRecipe.objects.create(
+                        user=user, recipe=recipe
+                    )
+                    Recipe.objects.filter(pk=recipe.pk).update(
+                        favorites_count=F('favorites_count') + 1
+                    )
+                    add_event(
+                        recipe.pk, settings.TRENDING_FAVORITE_WEIGHT,
+                        favorite.created_at
+                    )
+            except IntegrityError:
                 return Response(
                     {'errors': 'Рецепт уже добавлен в избранное'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            serializer = RecipeFavoriteSerializer(recipe)
-            FavoriteRecipe.objects.create(user=user, recipe=recipe)
+            serializer = RecipeFavoriteSerializer(
+                recipe, context={'request': request}
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            if FavoriteRecipe.objects.filter(user=user, recipe=recipe).exists():
-                FavoriteRecipe.objects.get(user=user, recipe=recipe).delete()
+            with transaction.atomic():
+                favorites = FavoriteRecipe.objects.filter(
+                    user=user, recipe=recipe
+                )
+                created_at = favorites.values_list(
+                    'created_at', flat=True
+                ).first()
+                deleted, _ = favorites.delete()
+                if deleted:
+                    Recipe.objects.filter(
+                        pk=recipe.pk, favorites_count__gt=0
+                    ).update(favorites_count=F('favorites_count') - 1)
+                    add_event(
+                        recipe.pk, -settings.TRENDING_FAVORITE_WEIGHT,
+                        created_at
+                    )
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {'errors': 'Рецепт не был добавлен в избранное'},
@@ -199,49 +357,175 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = get_object_or_404(Recipe, pk=kwargs['pk'])
 
         if request.method == 'POST':
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
+            try:
+                with transaction.atomic():
+                    item = ShoppingCart.objects.create(user=user, recipe=recipe)
+                    add_event(
+                        recipe.pk, settings.TRENDING_CART_WEIGHT,
+                        item.created_at
+                    )
+            except IntegrityError:
                 return Response(
                     {'errors': 'Рецепт уже добавлен в список покупок'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            serializer = RecipeFavoriteSerializer(recipe)
-            ShoppingCart.objects.create(user=user, recipe=recipe)
+            serializer = RecipeFavoriteSerializer(
+                recipe, context={'request': request}
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            if ShoppingCart.objects.filter(user=user, recipe=recipe).exists():
-                ShoppingCart.objects.get(user=user, recipe=recipe).delete()
+            with transaction.atomic():
+                items = ShoppingCart.objects.filter(user=user, recipe=recipe)
+                created_at = items.values_list('created_at', flat=True).first()
+                deleted, _ = items.delete()
+                if deleted:
+                    add_event(
+                        recipe.pk, -settings.TRENDING_CART_WEIGHT, created_at
+                    )
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 {'errors': 'Рецепт не был добавлен в список покупок'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(
+        detail=False, methods=['get'], url_name='feed', url_path='feed',
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """Новые рецепты авторов из подписок, постранично по курсору."""
+        paginator = FeedPagination()
+        recipe_ids = paginator.paginate_ids(
+            request,
+            lambda before, limit: feed_recipe_ids(request.user, before, limit)
+        )
+        recipes = self.get_queryset().filter(pk__in=recipe_ids).order_by('-id')
+        serializer = GetRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=True, methods=['get'],
+        url_name='similar', url_path='similar'
+    )
+    def similar(self, request, pk=None):
+        """Похожие рецепты из таблицы compute_similar одним запросом."""
+        if not is_valid_id(pk):
+            raise Http404
+        rows = list(
+            SimilarRecipe.objects.filter(recipe_id=pk)
+            .select_related('similar').defer('similar__search_vector')
+            .order_by('-score', '-similar_id')
+        )
+        if not rows and not Recipe.objects.filter(pk=pk).exists():
+            raise Http404
+        data = RecipeFavoriteSerializer(
+            [row.similar for row in rows], many=True,
+            context=self.get_serializer_context()
+        ).data
+        for item, row in zip(data, rows):
+            item['score'] = round(row.score, 3)
+        return Response(data)
+
+    @action(
+        detail=False, methods=['get'],
+        url_name='by_ingredients', url_path='by_ingredients'
+    )
+    def by_ingredients(self, request):
+        """Рецепты из имеющихся ингредиентов, по доле покрытия рецепта."""
+        ingredient_ids = request.query_params.getlist('ingredients')
+        if not ingredient_ids or not all(
+                is_valid_id(value) for value in ingredient_ids):
+            return Response(
+                {'errors': 'Укажите id ингредиентов в параметре ingredients'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ingredient_ids) > settings.BY_INGREDIENTS_MAX:
+            return Response(
+                {'errors': 'Не больше '
+                           f'{settings.BY_INGREDIENTS_MAX} ингредиентов'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            min_coverage = float(
+                request.query_params.get('min_coverage', 0)
+            )
+        except ValueError:
+            min_coverage = -1
+        if not 0 <= min_coverage <= 1:
+            return Response(
+                {'errors': 'min_coverage должен быть от 0 до 1'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        result = recipe_ingredient_index.search(
+            map(int, ingredient_ids), min_coverage
+        )
+        paginator = SequencePagination()
+        page = paginator.paginate_queryset(result, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        # Рецепты, удаленные другим процессом, убираются из индекса здесь.
+        recipe_ingredient_index.discard(
+            [recipe_id for recipe_id, _, _ in page if recipe_id not in recipes]
+        )
+        page = [row for row in page if row[0] in recipes]
+        data = GetRecipeSerializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page], many=True,
+            context=self.get_serializer_context()
+        ).data
+        for item, (_, matched, total) in zip(data, page):
+            item['coverage'] = round(matched / total, 3)
+            item['missing_count'] = total - matched
+        return paginator.get_paginated_response(data)
+
     @action(
         detail=False, methods=['get'],
         url_name='download_shopping_cart', url_path='download_shopping_cart',
         permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        user = request.user
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in FILE_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: ' + ', '.join(FILE_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         queryset = (
-            ShoppingCart.objects.filter(user=user)
-            .values(
-                'recipe__ingredients__name',
-                'recipe__ingredients__measurement_unit'
+            IngredientInRecipe.objects.filter(
+                recipe__in=ShoppingCart.objects.filter(
+                    user=request.user
+                ).values('recipe')
             )
-            .annotate(Sum('recipe__ingredientinrecipe__amount'))
-            .order_by('recipe__ingredients__name')
+            .values('ingredients__name', 'ingredients__measurement_unit')
+            .annotate(amount=Sum('amount'))
+            .order_by('ingredients__name')
         )
 
-        shopping_list = ['Список покупок:\n\n']
-        for item in queryset:
-            name = item['recipe__ingredients__name'].capitalize()
-            measurement_unit = item['recipe__ingredients__measurement_unit']
-            amount = item['recipe__ingredientinrecipe__amount__sum']
-            shopping_list.append(f'{name} ({measurement_unit}) — {amount};\n')
-
-        response = HttpResponse(shopping_list)
-        response['Content-Type'] = 'text/plain'
-        response['Content-Disposition'] = 'attachment; filename="shopping_cart.txt"'
+        render, content_type = FILE_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            render(queryset.iterator()), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"'
+        )
         return response
+
+
+def metrics_view(request):
+    """Метрики процесса в формате Prometheus.
+
+    Доступны только с заголовком Authorization: Bearer <METRICS_TOKEN>,
+    nginx их наружу не проксирует.
+    """
+    expected = f'Bearer {settings.METRICS_TOKEN}'
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''), expected):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
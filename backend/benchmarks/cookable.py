@@ -0,0 +1,96 @@
+"""
+Поиск рецептов по имеющимся ингредиентам: построение индекса и запросы.
+
+Запуск из каталога backend на большой базе:
+    python manage.py seed_data --users 10000 --recipes 1000000
+    python benchmarks/cookable.py --ingredients 3 10 30
+
+Для сравнения выполняется тот же подсчет покрытия через
+IngredientInRecipe с GROUP BY (--sql).
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def sql_search(ingredient_ids, limit):
+    """Покрытие через IngredientInRecipe, GROUP BY и подзапрос на рецепт."""
+    from django.db.models import Count, F, FloatField, OuterRef, Subquery
+    from django.db.models.functions import Cast
+
+    from recipes.models import IngredientInRecipe
+
+    totals = (
+        IngredientInRecipe.objects.filter(recipe=OuterRef('recipe'))
+        .order_by().values('recipe')
+        .annotate(total=Count('ingredients', distinct=True)).values('total')
+    )
+    return list(
+        IngredientInRecipe.objects.filter(ingredients__in=ingredient_ids)
+        .order_by().values('recipe')
+        .annotate(matched=Count('ingredients', distinct=True))
+        .annotate(total=Subquery(totals))
+        .annotate(coverage=Cast(F('matched'), FloatField()) / F('total'))
+        .order_by('-coverage', '-matched', '-recipe_id')
+        .values_list('recipe', flat=True)[:limit]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--ingredients', type=int, nargs='+',
+                        default=[3, 10, 30],
+                        help='Сколько ингредиентов в запросе')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=6)
+    parser.add_argument('--sql', action='store_true',
+                        help='Замерить и запрос к базе')
+    parser.add_argument('--seed', type=int, default=42)
+    options = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.db import connection
+
+    from api.cookable import recipe_ingredient_index
+    from recipes.models import Ingredient
+
+    started = time.perf_counter()
+    recipe_ingredient_index.build()
+    print(f'База: {connection.vendor}, рецептов в индексе: '
+          f'{len(recipe_ingredient_index.recipe_ids)}, построение '
+          f'{time.perf_counter() - started:.1f} с')
+    used = list(recipe_ingredient_index.ingredient_ids.tolist())
+    if not used:
+        raise SystemExit('Нет данных: запустите manage.py seed_data')
+    known = set(Ingredient.objects.values_list('pk', flat=True))
+    used = [pk for pk in used if pk in known]
+    generator = random.Random(options.seed)
+    for size in options.ingredients:
+        ingredient_ids = generator.sample(used, min(size, len(used)))
+        timings = []
+        for _ in range(options.iterations):
+            started = time.perf_counter()
+            result = recipe_ingredient_index.search(ingredient_ids)
+            page = result[:options.limit]
+            timings.append(time.perf_counter() - started)
+        print(f'\n{size} ингредиентов: найдено {len(result)}, медиана '
+              f'{statistics.median(timings) * 1000:.2f} ms')
+        if options.sql:
+            started = time.perf_counter()
+            found = sql_search(ingredient_ids, options.limit)
+            print(f'SQL: {(time.perf_counter() - started) * 1000:.2f} ms, '
+                  f'страница совпадает: '
+                  f'{found == [row[0] for row in page]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Сколько соединений с базой открывается при разных CONN_MAX_AGE.
+
+Запуск из каталога backend на заполненной базе:
+    python benchmarks/db_connections.py --max-age 0 60
+
+Запросы идут через тестовый клиент Django в одном процессе. Клиент
+отключает close_old_connections, поэтому он вызывается здесь вручную,
+как на сервере в начале каждого запроса.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def connect_ms(samples=20):
+    """Среднее время установки нового соединения."""
+    from django.db import connection
+
+    started = time.perf_counter()
+    for _ in range(samples):
+        connection.close()
+        connection.ensure_connection()
+    return round((time.perf_counter() - started) / samples * 1000, 3)
+
+
+def bench_max_age(max_age, options):
+    from django.db import close_old_connections, connection
+    from django.test import Client
+
+    from api import metrics
+
+    connection.close()
+    connection.settings_dict['CONN_MAX_AGE'] = max_age
+    metrics.reset()
+    client = Client(HTTP_HOST='localhost')
+    started = time.perf_counter()
+    for _ in range(options.requests):
+        close_old_connections()
+        response = client.get(options.path)
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - started
+    counters = metrics.get_counters()
+    handshakes = counters.get('db_connections_total', 0)
+    return {
+        'conn_max_age': max_age,
+        'path': options.path,
+        'requests': options.requests,
+        'rps': round(options.requests / elapsed, 1),
+        'handshakes': int(handshakes),
+        'handshakes_per_s': round(handshakes / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--max-age', type=int, nargs='+', default=[0, 60])
+    parser.add_argument('--path', default='/api/recipes/')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    options = parser.parse_args()
+
+    import django
+    django.setup()
+    setup_ms = connect_ms()
+    results = [bench_max_age(age, options) for age in options.max_age]
+    print(f'Установка соединения: {setup_ms} ms')
+    for result in results:
+        result['setup_ms_avg'] = setup_ms
+        print('CONN_MAX_AGE={conn_max_age:<4} {rps:>8} rps  '
+              '{handshakes_per_s:>8} соединений/с'.format(**result))
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Сравнение режимов gunicorn на списке рецептов.
+
+Запуск из каталога backend на заполненной базе:
+    python benchmarks/gunicorn_modes.py --modes sync gthread uvicorn
+
+Для каждого режима поднимает gunicorn с foodgram.gunicorn_conf,
+дает нагрузку из --concurrency потоков и печатает rps, p50 и p99.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+MODES = ('sync', 'gthread', 'uvicorn')
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер не ответил за {timeout} с: {url}')
+
+
+def fetch(url):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=30) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_load(url, requests, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(fetch, [url] * requests))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def bench_mode(mode, options):
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=mode,
+               GUNICORN_BIND=f'127.0.0.1:{options.port}')
+    if options.workers:
+        env['GUNICORN_WORKERS'] = str(options.workers)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c',
+         'python:foodgram.gunicorn_conf'],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{options.port}{options.path}'
+    try:
+        wait_ready(url)
+        run_load(url, options.warmup, options.concurrency)
+        return dict(run_load(url, options.requests, options.concurrency),
+                    mode=mode, path=options.path)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--path', default='/api/recipes/')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    options = parser.parse_args()
+
+    results = [bench_mode(mode, options) for mode in options.modes]
+    for result in results:
+        print('{mode:8} {rps:>8} rps  p50 {p50_ms:>8} ms  '
+              'p99 {p99_ms:>8} ms'.format(**result))
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
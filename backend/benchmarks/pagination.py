@@ -0,0 +1,129 @@
+"""
+Первая и глубокая страница списка рецептов: OFFSET против курсора.
+
+Запуск из каталога backend на большой базе:
+    python manage.py seed_data --users 10000 --recipes 1000000
+    python benchmarks/pagination.py --pages 1 10000
+
+Режимы:
+    offset    ?page=N, LIMIT/OFFSET и COUNT(*)
+    no_count  ?page=N&count=0, LIMIT/OFFSET без COUNT(*)
+    cursor    ?cursor=..., поиск по ключу id < последнего id прошлой страницы
+
+Курсор глубокой страницы строится по id, как его выдала бы ссылка next.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+PATH = '/api/recipes/'
+MODES = ('offset', 'no_count', 'cursor')
+
+
+def cursor_url(page, limit):
+    """Ссылка на страницу page в режиме курсора."""
+    from rest_framework.pagination import Cursor
+
+    from api.pagination import IdCursorPagination
+    from recipes.models import Recipe
+
+    url = f'{PATH}?limit={limit}&pagination=cursor'
+    if page == 1:
+        return url
+    position = (
+        Recipe.objects.order_by('-id')
+        .values_list('id', flat=True)[(page - 1) * limit - 1]
+    )
+    pagination = IdCursorPagination()
+    pagination.base_url = url
+    return pagination.encode_cursor(
+        Cursor(offset=0, reverse=False, position=str(position))
+    )
+
+
+def page_url(mode, page, limit):
+    if mode == 'cursor':
+        return cursor_url(page, limit)
+    url = f'{PATH}?limit={limit}&page={page}'
+    if mode == 'no_count':
+        url += '&count=0'
+    return url
+
+
+def measure(client, url, iterations):
+    from django.db import connection
+
+    from api.middleware import QueryCollector
+
+    client.get(url)
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        collector = QueryCollector(keep_samples=False)
+        started = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            response = client.get(url)
+        timings.append(time.perf_counter() - started)
+        queries.append(collector.count)
+        if response.status_code != 200:
+            raise AssertionError(f'{response.status_code}: {url}')
+    return {
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3),
+        'queries': int(statistics.median(queries)),
+        'first_id': (response.json()['results'] or [{}])[0].get('id'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10000])
+    parser.add_argument('--limit', type=int, default=6)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    options = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test import Client
+
+    from recipes.models import Recipe
+
+    total = Recipe.objects.count()
+    print(f'База: {connection.vendor}, рецептов: {total}')
+    deepest = max(options.pages)
+    if (deepest - 1) * options.limit >= total:
+        raise SystemExit(
+            f'Для страницы {deepest} нужно больше '
+            f'{(deepest - 1) * options.limit} рецептов'
+        )
+    client = Client(HTTP_HOST='localhost')
+    results = []
+    print(f'\n{"режим":10} {"страница":>9} {"медиана, ms":>12} '
+          f'{"макс, ms":>10} {"SQL":>4} {"первый id":>10}')
+    for page in options.pages:
+        for mode in MODES:
+            result = dict(mode=mode, page=page, **measure(
+                client, page_url(mode, page, options.limit),
+                options.iterations,
+            ))
+            results.append(result)
+            print('{mode:10} {page:>9} {median_ms:>12} {max_ms:>10} '
+                  '{queries:>4} {first_id:>10}'.format(**result))
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump({'recipes': total, 'database': connection.vendor,
+                       'results': results}, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
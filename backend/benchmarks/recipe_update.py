@@ -0,0 +1,158 @@
+"""
+Редактирование рецепта с 30 ингредиентами: запросы и записанные строки.
+
+Запуск из каталога backend на данных из manage.py seed_data:
+    python benchmarks/recipe_update.py --ingredients 30
+
+Рецепт создается для пользователя бенчмарка и удаляется в конце.
+Сценарии PATCH меняют количество одного ингредиента, добавляют или
+убирают один ингредиент, меняют только название или отправляют те же
+данные. Записанные строки — сумма rowcount по INSERT, UPDATE и DELETE.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class WriteCollector:
+    """Обертка connection.execute_wrapper: запросы и измененные строки."""
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.tables = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        statement = sql.lstrip().split(None, 1)[0].upper()
+        if statement in WRITES:
+            rows = max(context['cursor'].rowcount, 0)
+            self.rows += rows
+            table = sql.split('"')[1] if '"' in sql else '?'
+            key = f'{statement} {table}'
+            self.tables[key] = self.tables.get(key, 0) + rows
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--ingredients', type=int, default=30)
+    parser.add_argument('--iterations', type=int, default=20)
+    options = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test import Client
+    from rest_framework.authtoken.models import Token
+
+    from recipes.management.commands.seed_data import PREFIX
+    from recipes.models import Ingredient, IngredientInRecipe, Recipe
+    from users.models import User
+
+    user = (
+        User.objects.filter(username__startswith=PREFIX)
+        .exclude(recipes=None).order_by('pk').first()
+    )
+    if user is None:
+        raise SystemExit('Нет данных: запустите manage.py seed_data')
+    ingredient_ids = list(
+        Ingredient.objects.order_by('pk')
+        .values_list('pk', flat=True)[:options.ingredients + 1]
+    )
+    if len(ingredient_ids) <= options.ingredients:
+        raise SystemExit('Мало ингредиентов: запустите manage.py load_data')
+    spare = ingredient_ids.pop()
+    source = user.recipes.order_by('pk').first()
+    recipe = Recipe.objects.create(
+        author=user, name='Бенчмарк', text='Рецепт из бенчмарка',
+        cooking_time=15, image=source.image.name,
+        image_renditions=source.image_renditions,
+    )
+    recipe.tags.set(source.tags.all())
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(recipe=recipe, ingredients_id=pk, amount=10)
+        for pk in ingredient_ids
+    )
+    tags = list(recipe.tags.values_list('pk', flat=True))
+    token, _ = Token.objects.get_or_create(user=user)
+    client = Client(
+        HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}'
+    )
+    path = f'/api/recipes/{recipe.pk}/'
+
+    def payload(ids, changed=None, name='Бенчмарк'):
+        return {
+            'name': name,
+            'text': 'Рецепт из бенчмарка',
+            'cooking_time': 15,
+            'tags': tags,
+            'ingredients': [
+                {'id': pk, 'amount': 11 if pk == changed else 10}
+                for pk in ids
+            ],
+        }
+
+    # Каждый сценарий чередует два состояния, чтобы изменение было
+    # в каждом повторе.
+    scenarios = {
+        'amount_of_one': (
+            payload(ingredient_ids, changed=ingredient_ids[0]),
+            payload(ingredient_ids),
+        ),
+        'add_one': (
+            payload(ingredient_ids + [spare]), payload(ingredient_ids),
+        ),
+        'remove_one': (
+            payload(ingredient_ids[1:]), payload(ingredient_ids),
+        ),
+        'name_only': (
+            payload(ingredient_ids, name='Бенчмарк 2'),
+            payload(ingredient_ids),
+        ),
+        'unchanged': (payload(ingredient_ids), payload(ingredient_ids)),
+    }
+    print(f'База: {connection.vendor}, ингредиентов в рецепте: '
+          f'{len(ingredient_ids)}')
+    print(f'\n{"сценарий":16} {"медиана, ms":>12} {"SQL":>4} '
+          f'{"строк записано":>15}')
+    try:
+        for name, states in scenarios.items():
+            timings = []
+            collectors = []
+            for iteration in range(options.iterations):
+                collector = WriteCollector()
+                started = time.perf_counter()
+                with connection.execute_wrapper(collector):
+                    response = client.patch(
+                        path, states[iteration % 2],
+                        content_type='application/json',
+                    )
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise AssertionError(
+                        f'{response.status_code}: {response.content[:300]}'
+                    )
+                # Нечетные повторы возвращают рецепт в исходное состояние.
+                if not iteration % 2:
+                    collectors.append(collector)
+            collector = collectors[-1]
+            print(f'{name:16} {statistics.median(timings) * 1000:>12.3f} '
+                  f'{collector.queries:>4} {collector.rows:>15}')
+            for key, rows in sorted(collector.tables.items()):
+                print(f'    {key}: {rows}')
+    finally:
+        recipe.delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+"""
+Бенчмарк API на данных из manage.py seed_data.
+
+Запуск из каталога backend:
+    python manage.py seed_data --users 1000 --recipes 10000
+    python benchmarks/run.py --output before.json
+    ... изменения ...
+    python benchmarks/run.py --compare before.json
+
+Запросы идут через тестовый клиент Django в одном процессе, без сети,
+поэтому видно время самого приложения и базы. Для каждого сценария
+сохраняются медиана, p95, p99 и число SQL-запросов.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+SCENARIOS = {}
+LARGE_CART = 500
+
+
+def scenario(name):
+    def register(function):
+        SCENARIOS[name] = function
+        return function
+    return register
+
+
+class Context:
+    """Пользователь с подписками и корзиной, клиенты и id для запросов."""
+    def __init__(self):
+        from django.test import Client
+        from rest_framework.authtoken.models import Token
+
+        from recipes.management.commands.seed_data import PREFIX
+        from recipes.models import Ingredient, Recipe, Tag
+        from users.models import User
+
+        self.user = (
+            User.objects.filter(username__startswith=PREFIX)
+            .exclude(recipes=None).order_by('pk').first()
+        )
+        if self.user is None:
+            raise SystemExit('Нет данных: запустите manage.py seed_data')
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.anonymous = Client(HTTP_HOST='localhost')
+        self.client = Client(
+            HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        self.recipe = Recipe.objects.exclude(author=self.user).order_by(
+            '-pk'
+        ).first()
+        self.own_recipe = self.user.recipes.order_by('pk').first()
+        self.tag_slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)[:6]
+        )
+        self.image = self.make_image()
+        self.created = []
+        self.toggle = 0
+        self._large_cart_client = None
+
+    @property
+    def large_cart_client(self):
+        """Клиент пользователя с LARGE_CART рецептами в корзине."""
+        if self._large_cart_client is None:
+            from django.test import Client
+            from rest_framework.authtoken.models import Token
+
+            from recipes.management.commands.seed_data import PREFIX
+            from recipes.models import Recipe, ShoppingCart
+            from users.models import User
+
+            user, _ = User.objects.get_or_create(
+                username=f'{PREFIX}large_cart',
+                defaults={'email': f'{PREFIX}large_cart@example.com'},
+            )
+            ShoppingCart.objects.bulk_create(
+                (
+                    ShoppingCart(user=user, recipe_id=recipe_id)
+                    for recipe_id in Recipe.objects.order_by('pk')
+                    .values_list('pk', flat=True)[:LARGE_CART]
+                ),
+                ignore_conflicts=True,
+            )
+            token, _ = Token.objects.get_or_create(user=user)
+            self._large_cart_client = Client(
+                HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}'
+            )
+        return self._large_cart_client
+
+    def make_image(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), '#49B64E').save(buffer, 'PNG')
+        return 'data:image/png;base64,' + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+
+    def recipe_payload(self, amount=10):
+        return {
+            'tags': [],
+            'ingredients': [
+                {'id': pk, 'amount': amount} for pk in self.ingredient_ids
+            ],
+            'name': 'Бенчмарк',
+            'text': 'Рецепт из бенчмарка',
+            'cooking_time': 15,
+        }
+
+    def cleanup(self):
+        from recipes.models import ImageTask, Recipe
+
+        for task in ImageTask.objects.filter(recipe__in=self.created):
+            task.source.delete(save=False)
+        Recipe.objects.filter(pk__in=self.created).delete()
+        self.created = []
+
+
+def read(response, expected=200):
+    if response.status_code != expected:
+        raise AssertionError(
+            f'{response.status_code} вместо {expected}: {response.content[:300]}'
+        )
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+@scenario('recipes_list_anonymous')
+def recipes_list_anonymous(ctx):
+    read(ctx.anonymous.get('/api/recipes/'))
+
+
+@scenario('recipes_list_authenticated')
+def recipes_list_authenticated(ctx):
+    read(ctx.client.get('/api/recipes/'))
+
+
+@scenario('recipes_list_without_count')
+def recipes_list_without_count(ctx):
+    read(ctx.client.get('/api/recipes/?count=0&page=50'))
+
+
+@scenario('recipes_list_cursor')
+def recipes_list_cursor(ctx):
+    read(ctx.client.get('/api/recipes/?pagination=cursor'))
+
+
+@scenario('recipes_filter_tags')
+def recipes_filter_tags(ctx):
+    query = '&'.join(f'tags={slug}' for slug in ctx.tag_slugs)
+    read(ctx.client.get(f'/api/recipes/?{query}'))
+
+
+@scenario('recipes_filter_favorited')
+def recipes_filter_favorited(ctx):
+    read(ctx.client.get('/api/recipes/?is_favorited=1'))
+
+
+@scenario('recipes_filter_author')
+def recipes_filter_author(ctx):
+    read(ctx.client.get(f'/api/recipes/?author={ctx.recipe.author_id}'))
+
+
+@scenario('recipes_trending')
+def recipes_trending(ctx):
+    read(ctx.client.get('/api/recipes/?ordering=trending'))
+
+
+@scenario('recipes_search')
+def recipes_search(ctx):
+    read(ctx.client.get('/api/recipes/?search=суп'))
+
+
+@scenario('recipes_feed')
+def recipes_feed(ctx):
+    read(ctx.client.get('/api/recipes/feed/'))
+
+
+@scenario('recipes_by_ingredients')
+def recipes_by_ingredients(ctx):
+    query = '&'.join(f'ingredients={pk}' for pk in ctx.ingredient_ids)
+    read(ctx.client.get(f'/api/recipes/by_ingredients/?{query}'))
+
+
+@scenario('recipe_detail')
+def recipe_detail(ctx):
+    read(ctx.client.get(f'/api/recipes/{ctx.recipe.pk}/'))
+
+
+@scenario('recipe_similar')
+def recipe_similar(ctx):
+    read(ctx.client.get(f'/api/recipes/{ctx.recipe.pk}/similar/'))
+
+
+@scenario('recipe_create')
+def recipe_create(ctx):
+    payload = dict(ctx.recipe_payload(), image=ctx.image,
+                   tags=[ctx.own_recipe.tags.values_list('pk', flat=True)[0]])
+    response = ctx.client.post(
+        '/api/recipes/', payload, content_type='application/json'
+    )
+    read(response, 201)
+    ctx.created.append(response.json()['id'])
+
+
+@scenario('recipe_update')
+def recipe_update(ctx):
+    ctx.toggle = 1 - ctx.toggle
+    payload = ctx.recipe_payload(amount=10 + ctx.toggle)
+    payload['tags'] = list(ctx.own_recipe.tags.values_list('pk', flat=True))
+    read(ctx.client.patch(
+        f'/api/recipes/{ctx.own_recipe.pk}/', payload,
+        content_type='application/json'
+    ))
+
+
+@scenario('favorite_add_remove')
+def favorite_add_remove(ctx):
+    path = f'/api/recipes/{ctx.recipe.pk}/favorite/'
+    ctx.client.delete(path)
+    read(ctx.client.post(path), 201)
+    read(ctx.client.delete(path), 204)
+
+
+@scenario('subscriptions')
+def subscriptions(ctx):
+    read(ctx.client.get('/api/users/subscriptions/?recipes_limit=3'))
+
+
+@scenario('users_me')
+def users_me(ctx):
+    read(ctx.client.get('/api/users/me/'))
+
+
+@scenario('tags_list')
+def tags_list(ctx):
+    read(ctx.client.get('/api/tags/'))
+
+
+@scenario('ingredients_search')
+def ingredients_search(ctx):
+    read(ctx.client.get('/api/ingredients/?name=мук'))
+
+
+@scenario('shopping_cart_txt')
+def shopping_cart_txt(ctx):
+    read(ctx.client.get('/api/recipes/download_shopping_cart/'))
+
+
+@scenario('shopping_cart_csv')
+def shopping_cart_csv(ctx):
+    read(ctx.client.get(
+        '/api/recipes/download_shopping_cart/?file_format=csv'
+    ))
+
+
+@scenario('shopping_cart_pdf')
+def shopping_cart_pdf(ctx):
+    read(ctx.client.get(
+        '/api/recipes/download_shopping_cart/?file_format=pdf'
+    ))
+
+
+@scenario('shopping_cart_large_txt')
+def shopping_cart_large_txt(ctx):
+    read(ctx.large_cart_client.get('/api/recipes/download_shopping_cart/'))
+
+
+@scenario('shopping_cart_large_pdf')
+def shopping_cart_large_pdf(ctx):
+    read(ctx.large_cart_client.get(
+        '/api/recipes/download_shopping_cart/?file_format=pdf'
+    ))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(ctx, function, options):
+    from django.core.cache import cache
+    from django.db import connection
+
+    from api.middleware import QueryCollector
+
+    for _ in range(options.warmup):
+        function(ctx)
+    timings = []
+    queries = []
+    for _ in range(options.iterations):
+        if options.cold:
+            cache.clear()
+        collector = QueryCollector(keep_samples=False)
+        started = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            function(ctx)
+        timings.append(time.perf_counter() - started)
+        queries.append(collector.count)
+    return {
+        'iterations': options.iterations,
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'min_ms': round(min(timings) * 1000, 3),
+        'queries': int(statistics.median(queries)),
+    }
+
+
+def get_meta(options):
+    import django
+    from django.db import connection
+
+    from recipes.models import Recipe
+    from users.models import User
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'users': User.objects.count(),
+        'recipes': Recipe.objects.count(),
+        'cold_cache': options.cold,
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = json.load(file)['results']
+    print(f'\n{"сценарий":32} {"было, ms":>10} {"стало, ms":>10} '
+          f'{"изменение":>10} {"SQL":>9}')
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = (result['median_ms'] / before['median_ms'] - 1) * 100
+        print(f'{name:32} {before["median_ms"]:>10} '
+              f'{result["median_ms"]:>10} {change:>+9.1f}% '
+              f'{before["queries"]:>4}->{result["queries"]:<4}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', nargs='+', default=[],
+                        help='Сценарии, в названии которых есть подстрока')
+    parser.add_argument('--cold', action='store_true',
+                        help='Очищать кэш перед каждым запросом')
+    parser.add_argument('--output', help='Файл с результатами в JSON')
+    parser.add_argument('--compare', help='Сравнить с прошлым JSON')
+    options = parser.parse_args()
+
+    import django
+    django.setup()
+
+    ctx = Context()
+    results = {}
+    try:
+        for name, function in SCENARIOS.items():
+            if options.only and not any(
+                    part in name for part in options.only):
+                continue
+            results[name] = measure(ctx, function, options)
+            print('{name:32} median {median_ms:>9} ms  p99 {p99_ms:>9} ms  '
+                  'SQL {queries}'.format(name=name, **results[name]))
+    finally:
+        ctx.cleanup()
+
+    output = options.output or os.path.join(
+        RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump({'meta': get_meta(options), 'results': results}, file,
+                  indent=2, ensure_ascii=False)
+    print(f'Результаты сохранены в {output}')
+    if options.compare:
+        compare(results, options.compare)
+
+
+if __name__ == '__main__':
+    main()
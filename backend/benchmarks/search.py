@@ -0,0 +1,60 @@
+"""
+Полнотекстовый поиск рецептов: время и план запроса.
+
+Запуск из каталога backend на большой базе:
+    python manage.py seed_data --users 10000 --recipes 1000000
+    python benchmarks/search.py суп "пирог -яблоко" омлет
+
+На PostgreSQL в плане должен быть Bitmap Index Scan по
+recipes_recipe_search_vector, а не Seq Scan по всей таблице.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('terms', nargs='+')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=6)
+    options = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test import RequestFactory
+
+    from api.filters import RecipeFilter
+    from recipes.models import Recipe
+
+    request = RequestFactory().get('/api/recipes/')
+    request.user = None
+    search = RecipeFilter(request=request).filter_search
+    print(f'База: {connection.vendor}, рецептов: {Recipe.objects.count()}')
+    for term in options.terms:
+        queryset = search(
+            Recipe.objects.only('id', 'name'), 'search', term
+        )[:options.limit]
+        timings = []
+        for _ in range(options.iterations):
+            started = time.perf_counter()
+            found = list(queryset.values_list('id', flat=True))
+            timings.append(time.perf_counter() - started)
+        print(f'\n«{term}»: найдено на странице {len(found)}, медиана '
+              f'{statistics.median(timings) * 1000:.2f} ms')
+        if connection.vendor == 'postgresql':
+            print(queryset.explain(analyze=True, buffers=True))
+        else:
+            print(queryset.explain())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+from django.db.backends.postgresql import base
+
+from foodgram.db import timed_wrapper
+
+DatabaseWrapper = timed_wrapper(base.DatabaseWrapper)
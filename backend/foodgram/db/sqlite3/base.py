@@ -0,0 +1,5 @@
+from django.db.backends.sqlite3 import base
+
+from foodgram.db import timed_wrapper
+
+DatabaseWrapper = timed_wrapper(base.DatabaseWrapper)
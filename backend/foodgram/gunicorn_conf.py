@@ -0,0 +1,116 @@
+"""
+Настройки gunicorn: gunicorn -c python:foodgram.gunicorn_conf
+
+Режим выбирается переменной GUNICORN_WORKER_CLASS:
+sync, gthread (по умолчанию) или uvicorn (ASGI, foodgram.asgi).
+Число процессов и потоков считается от числа ядер, если не задано явно.
+"""
+import multiprocessing
+import os
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+mode = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if mode not in WORKER_CLASSES:
+    raise ValueError(
+        f'GUNICORN_WORKER_CLASS должен быть одним из: '
+        f'{", ".join(WORKER_CLASSES)}'
+    )
+cpu_count = multiprocessing.cpu_count()
+
+wsgi_app = (
+    'foodgram.asgi:application' if mode == 'uvicorn'
+    else 'foodgram.wsgi:application'
+)
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = WORKER_CLASSES[mode]
+# Потоки gthread ждут базу, поэтому процессов нужно меньше, чем для sync.
+# Django 3.1 под ASGI выполняет синхронные view в одном потоке процесса,
+# так что uvicorn считается как sync.
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', cpu_count + 1 if mode == 'gthread' else cpu_count * 2 + 1
+))
+threads = int(os.getenv('GUNICORN_THREADS', 4 if mode == 'gthread' else 1))
+
+# Приложение загружается до fork и делится между воркерами copy-on-write.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+# Перезапуск воркеров против утечек памяти, с разбросом, чтобы не все сразу.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Сердцебиение воркеров в памяти, а не на диске overlayfs контейнера.
+worker_tmp_dir = os.getenv(
+    'GUNICORN_WORKER_TMP_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else None
+)
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+
+
+metrics_dir = os.getenv('METRICS_MULTIPROC_DIR', '')
+
+
+def build_indexes(log):
+    """Индексы в памяти: рецепты по ингредиентам и поиск ингредиентов."""
+    from django.conf import settings
+    from django.db import DatabaseError, connections
+
+    from api.autocomplete import ingredient_index
+    from api.cookable import recipe_ingredient_index
+
+    try:
+        recipe_ingredient_index.build()
+        if settings.INGREDIENT_INDEX_IN_MEMORY:
+            ingredient_index.build()
+    except DatabaseError as error:
+        log.warning('Индексы в памяти не построены: %s', error)
+    connections.close_all()
+
+
+def when_ready(server):
+    """С preload_app индексы строятся в мастере до fork.
+
+    Воркерам они достаются copy-on-write.
+    """
+    if preload_app:
+        build_indexes(server.log)
+
+
+def post_worker_init(worker):
+    """Без preload_app каждый воркер строит индексы до первого запроса."""
+    if not preload_app:
+        build_indexes(worker.log)
+
+
+def post_fork(server, worker):
+    """Соединения, открытые до fork, не должны делиться между воркерами."""
+    from django.db import connections
+
+    connections.close_all()
+
+
+def on_starting(server):
+    """Метрики прошлого запуска не должны попасть в новые счетчики."""
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            os.remove(os.path.join(metrics_dir, name))
+
+
+def worker_exit(server, worker):
+    """Последние метрики воркера сохраняются до выхода."""
+    from api import metrics
+
+    metrics.flush(force=True)
+
+
+def child_exit(server, worker):
+    if metrics_dir:
+        from api import metrics
+
+        metrics.mark_process_dead(metrics_dir, worker.pid)
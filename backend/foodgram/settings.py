@@ -10,7 +10,7 @@ SECRET_KEY = 'h%p7_o7wzxw)8cbxy%a*whsr!2160jft@st55cghr-n568mhj6'
 
 DEBUG = False
 
-ALLOWED_HOSTS = ['localhost', '127.0.0.1', '158.160.37.167']
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', '158.160.37.167', 'backend']
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,10 +68,57 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        # Для PgBouncer в режиме transaction серверные курсоры недоступны.
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_DISABLE_SERVER_SIDE_CURSORS', 'False'
+        ) == 'True',
     }
 }
 
+# Постоянное соединение проверяется (SELECT 1) в начале запроса и
+# закрывается, если база его уже разорвала.
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Версии справочников и токены в кэше видны всем воркерам gunicorn только
+# в общем кэше (Redis). С кэшем в памяти процесса эти кэши выключены.
+SHARED_CACHE = os.getenv('SHARED_CACHE', str(
+    CACHES['default']['BACKEND'] not in (
+        'django.core.cache.backends.locmem.LocMemCache',
+        'django.core.cache.backends.dummy.DummyCache',
+    )
+)) == 'True'
+
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', 600))
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 60))
+
+REQUEST_METRICS_ENABLED = (
+    os.getenv('REQUEST_METRICS_ENABLED', 'False') == 'True'
+)
+# Без токена /metrics не подключается.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+# Каталог, где воркеры gunicorn сохраняют свои метрики для /metrics;
+# без него /metrics отдает метрики только ответившего процесса.
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 1))
+SLOW_REQUEST_SECONDS = (
+    float(os.getenv('SLOW_REQUEST_SECONDS'))
+    if os.getenv('SLOW_REQUEST_SECONDS') else None
+)
+SLOW_REQUEST_SQL_SAMPLES = int(os.getenv('SLOW_REQUEST_SQL_SAMPLES', 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -92,10 +140,15 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
+PAGINATION_COUNT_LIMIT = (
+    int(os.getenv('PAGINATION_COUNT_LIMIT'))
+    if os.getenv('PAGINATION_COUNT_LIMIT') else None
+)
+
 DJOSER = {
     'SET_PASSWORD_RETYPE': True,
     'SERIALIZERS': {
@@ -122,3 +175,53 @@ AUTH_USER_MODEL = 'users.User'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Индекс сверяет версию 'ingredients' с общим кэшем; без него правки
+# в одном воркере не дошли бы до остальных, и поиск идет в базу.
+INGREDIENT_INDEX_IN_MEMORY = SHARED_CACHE and (
+    os.getenv('INGREDIENT_INDEX_IN_MEMORY', 'False') == 'True'
+)
+
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.getenv('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_WIDTHS = (320, 640, 1280)
+RECIPE_IMAGE_QUALITY = 85
+RECIPE_IMAGE_MAX_ATTEMPTS = 3
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Авторы с таким числом подписчиков не раскладываются по лентам,
+# их рецепты подмешиваются при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 1000))
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_BACKFILL_RECIPES = 20
+
+# Индекс ингредиент -> рецепты для поиска по продуктам, см. api/cookable.py.
+RECIPE_INGREDIENT_INDEX_SYNC_SECONDS = int(
+    os.getenv('RECIPE_INGREDIENT_INDEX_SYNC_SECONDS', 5)
+)
+RECIPE_INGREDIENT_INDEX_REBUILD = 10000
+# Сколько ингредиентов можно передать в /api/recipes/by_ingredients/.
+BY_INGREDIENTS_MAX = 100
+
+# Похожие рецепты, см. recipes/similar.py. Ингредиенты и теги, которые
+# встречаются больше чем в SIMILAR_RECIPES_MAX_DF доле рецептов, не ищут
+# кандидатов, а только добавляются к сходству.
+SIMILAR_RECIPES_METRIC = os.getenv('SIMILAR_RECIPES_METRIC', 'cosine')
+SIMILAR_RECIPES_TOP_K = 10
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+SIMILAR_RECIPES_MAX_DF = 0.05
+# Сколько секунд кэшируется частота признаков для пересчета из очереди.
+SIMILAR_RECIPES_STATS_TIMEOUT = 60 * 60
+
+# Популярные рецепты, см. recipes/trending.py: вес события уменьшается
+# вдвое каждые TRENDING_HALF_LIFE_HOURS часов.
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+TRENDING_HORIZON_HALF_LIVES = 10
+TRENDING_MIN_SCORE = 0.05
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_CART_WEIGHT = 2.0
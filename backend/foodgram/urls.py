@@ -3,10 +3,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.views import metrics_view
+
 urlpatterns = [
     path('api/', include('api.urls', namespace='api')),
     path('admin/', admin.site.urls),
 ]
 
+if settings.REQUEST_METRICS_ENABLED and settings.METRICS_TOKEN:
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
+
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Ingredient, IngredientInRecipe, Recipe, Tag
+from .models import ImageTask, Ingredient, IngredientInRecipe, Recipe, Tag
 
 
 class IngredientInline(admin.TabularInline):
@@ -25,9 +25,19 @@ class IngredientAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'author', 'name', 'text', 'cooking_time')
+    list_display = (
+        'pk', 'author', 'name', 'text', 'cooking_time', 'favorites_count'
+    )
+    readonly_fields = ('favorites_count',)
     search_fields = ('author', 'name', 'recipe',)
     list_filter = ('name', 'author', 'tags')
     empty_value_display = 'пусто'
     inlines = (IngredientInline,)
     filter_horizontal = ('tags',)
+
+
+@admin.register(ImageTask)
+class ImageTaskAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'recipe', 'status', 'attempts', 'created_at')
+    list_filter = ('status',)
+    readonly_fields = ('error', 'started_at')
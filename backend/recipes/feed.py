@@ -0,0 +1,136 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from users.models import Follow
+
+from .models import FeedEntry, FeedPruneTask, FeedTask, Recipe
+
+
+def is_popular(author):
+    """Рецепты популярных авторов не раскладываются, а читаются сразу."""
+    return author.followers_count >= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def enqueue_fanout(recipe):
+    FeedTask.objects.create(recipe=recipe)
+
+
+def fan_out(recipe):
+    """Добавляет рецепт в ленты всех подписчиков автора."""
+    if is_popular(recipe.author):
+        return 0
+    follower_ids = (
+        Follow.objects.filter(author_id=recipe.author_id)
+        .values_list('user_id', flat=True).iterator()
+    )
+    created = 0
+    batch = []
+    for user_id in follower_ids:
+        batch.append(FeedEntry(
+            user_id=user_id, recipe_id=recipe.pk, author_id=recipe.author_id
+        ))
+        if len(batch) >= settings.FEED_FANOUT_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    return created + len(batch)
+
+
+def backfill_feed(user, author):
+    """Последние рецепты автора в ленту нового подписчика."""
+    if is_popular(author):
+        return
+    recipe_ids = author.recipes.order_by('-id').values_list(
+        'id', flat=True
+    )[:settings.FEED_BACKFILL_RECIPES]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user=user, recipe_id=recipe_id, author=author)
+            for recipe_id in recipe_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def process_feed_tasks(limit):
+    """Раскладывает рецепты из очереди, пропуская занятые другим воркером."""
+    with transaction.atomic():
+        tasks = list(
+            FeedTask.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('recipe__author')[:limit]
+        )
+        entries = sum(fan_out(task.recipe) for task in tasks)
+        FeedTask.objects.filter(pk__in=[task.pk for task in tasks]).delete()
+    return len(tasks), entries
+
+
+def enqueue_prune(user, author):
+    """Чистка ленты после отписки идет в воркере, а не в запросе.
+
+    У плодовитого автора в ленте подписчика тысячи записей, а читатель
+    их уже не видит: feed_recipe_ids берет только текущие подписки.
+    """
+    FeedPruneTask.objects.create(user=user, author=author)
+
+
+def prune_feed(user_id, author_id):
+    """Убирает из ленты рецепты автора, если подписки снова нет.
+
+    Проверка подписки в том же DELETE: при повторной подписке до чистки
+    записи backfill_feed остаются.
+    """
+    deleted, _ = (
+        FeedEntry.objects.filter(user_id=user_id, author_id=author_id)
+        .exclude(Exists(Follow.objects.filter(
+            user_id=OuterRef('user_id'), author_id=OuterRef('author_id')
+        )))
+        .delete()
+    )
+    return deleted
+
+
+def process_prune_tasks(limit):
+    """Чистит ленты из очереди, пропуская занятые другим воркером."""
+    with transaction.atomic():
+        tasks = list(
+            FeedPruneTask.objects.select_for_update(skip_locked=True)[:limit]
+        )
+        deleted = sum(
+            prune_feed(task.user_id, task.author_id) for task in tasks
+        )
+        FeedPruneTask.objects.filter(
+            pk__in=[task.pk for task in tasks]
+        ).delete()
+    return len(tasks), deleted
+
+
+def feed_recipe_ids(user, before, limit):
+    """id рецептов ленты по убыванию, меньше before.
+
+    Записи, разложенные воркером уже после отписки, пропускаются,
+    рецепты популярных авторов добавляются при чтении.
+    """
+    followed = Follow.objects.filter(user=user)
+    entries = FeedEntry.objects.filter(
+        user=user, author__in=followed.values('author')
+    )
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+    recipe_ids = set(
+        entries.order_by('-recipe_id')
+        .values_list('recipe_id', flat=True)[:limit]
+    )
+    popular = list(
+        followed.filter(
+            author__followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).values_list('author_id', flat=True)
+    )
+    if popular:
+        recipes = Recipe.objects.filter(author__in=popular)
+        if before is not None:
+            recipes = recipes.filter(pk__lt=before)
+        recipe_ids.update(
+            recipes.order_by('-id').values_list('id', flat=True)[:limit]
+        )
+    return sorted(recipe_ids, reverse=True)[:limit]
@@ -0,0 +1,225 @@
+import hashlib
+import io
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ImageTask, Recipe
+
+FORMATS = (
+    ('jpeg', 'JPEG', 'jpg'),
+    ('webp', 'WEBP', 'webp'),
+)
+
+
+def delete_files_on_commit(names):
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(
+            lambda: [default_storage.delete(name) for name in names]
+        )
+
+
+def enqueue_image(recipe, file):
+    """Сохраняет исходный файл как есть и ставит его в очередь обработки.
+
+    Пока копий нет, клиенты получают оригинал.
+    """
+    old_tasks = list(ImageTask.objects.filter(recipe=recipe))
+    ImageTask.objects.filter(pk__in=[task.pk for task in old_tasks]).delete()
+    task = ImageTask.objects.create(recipe=recipe, source=file)
+    delete_files_on_commit(
+        set([recipe.image.name] + rendition_names(recipe)
+            + [old.source.name for old in old_tasks])
+        - {task.source.name}
+    )
+    recipe.image.name = task.source.name
+    recipe.image_renditions = {}
+    recipe.image_status = Recipe.IMAGE_PENDING
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image=recipe.image.name, image_renditions={},
+        image_status=Recipe.IMAGE_PENDING,
+    )
+
+
+def encode(image, pil_format):
+    buffer = io.BytesIO()
+    image.save(
+        buffer, pil_format, quality=settings.RECIPE_IMAGE_QUALITY,
+        optimize=pil_format == 'JPEG'
+    )
+    return buffer.getvalue()
+
+
+def resize(image, width):
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def content_name(directory, content, suffix, extension):
+    """Имя по хэшу содержимого: такой файл можно кэшировать навсегда."""
+    digest = hashlib.sha256(content).hexdigest()[:20]
+    return f'{directory}/{digest}{suffix}.{extension}'
+
+
+def render_image(file, directory):
+    """Проверяет картинку и возвращает уменьшенные копии.
+
+    Оригинал не меняется: копии кладутся рядом, в directory.
+    """
+    with Image.open(file) as image:
+        image.verify()
+    file.seek(0)
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    files = {}
+    renditions = {}
+    for key, pil_format, extension in FORMATS:
+        renditions[key] = {}
+        for width in settings.RECIPE_IMAGE_WIDTHS:
+            content = encode(resize(image, width), pil_format)
+            name = content_name(directory, content, f'_{width}', extension)
+            files[name] = content
+            renditions[key][str(width)] = name
+    return files, renditions
+
+
+def save_file(name, content):
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, ContentFile(content))
+
+
+def enqueue_missing_renditions(batch_size=1000):
+    """Ставит в очередь картинки без копий, загруженные в обход API.
+
+    Пропускает рецепты, у которых задача уже есть. Возвращает число
+    поставленных задач.
+    """
+    recipes = Recipe.objects.filter(
+        image_renditions={}, image_status=Recipe.IMAGE_READY
+    ).exclude(image='').exclude(
+        Exists(ImageTask.objects.filter(recipe=OuterRef('pk')))
+    ).order_by('pk')
+    last_pk = 0
+    total = 0
+    while True:
+        batch = list(
+            recipes.filter(pk__gt=last_pk).values_list('pk', 'image')
+            [:batch_size]
+        )
+        if not batch:
+            return total
+        ImageTask.objects.bulk_create(
+            ImageTask(recipe_id=pk, source=image) for pk, image in batch
+        )
+        total += len(batch)
+        last_pk = batch[-1][0]
+
+
+def sorted_renditions(recipe, image_format):
+    """Пары (ширина, имя файла) копий в нужном формате по возрастанию."""
+    sizes = recipe.image_renditions.get(image_format, {})
+    return sorted((int(width), name) for width, name in sizes.items())
+
+
+def rendition_names(recipe):
+    return [
+        name
+        for sizes in recipe.image_renditions.values()
+        for name in sizes.values()
+    ]
+
+
+def process_image_task(task_id):
+    """Обрабатывает одну задачу очереди; вызывается из пула воркера."""
+    task = ImageTask.objects.get(pk=task_id)
+    try:
+        with task.source.open('rb') as source:
+            files, renditions = render_image(
+                io.BytesIO(source.read()), f'recipes/{task.recipe_id}'
+            )
+    except Exception as error:
+        # Сбой хранилища или воркера может быть временным: задача
+        # возвращается в очередь, пока не кончатся попытки.
+        if task.attempts < settings.RECIPE_IMAGE_MAX_ATTEMPTS:
+            ImageTask.objects.filter(pk=task.pk).update(
+                status=ImageTask.PENDING, error=str(error)
+            )
+            return False
+        with transaction.atomic():
+            ImageTask.objects.filter(pk=task.pk).update(
+                status=ImageTask.FAILED, error=str(error)
+            )
+            Recipe.objects.filter(pk=task.recipe_id).update(
+                image_status=Recipe.IMAGE_FAILED, updated_at=timezone.now()
+            )
+        return False
+
+    saved = {
+        name: save_file(name, content) for name, content in files.items()
+    }
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=task.recipe_id
+        ).first()
+        if recipe is None or not ImageTask.objects.filter(
+                pk=task.pk).exists():
+            delete_files_on_commit(saved.values())
+            return False
+        delete_files_on_commit(
+            set([recipe.image.name] + rendition_names(recipe))
+            - set(saved.values()) - {task.source.name}
+        )
+        recipe.image.name = task.source.name
+        recipe.image_renditions = {
+            key: {width: saved[name] for width, name in sizes.items()}
+            for key, sizes in renditions.items()
+        }
+        recipe.image_status = Recipe.IMAGE_READY
+        recipe.save(update_fields=(
+            'image', 'image_renditions', 'image_status', 'updated_at'
+        ))
+        task.delete()
+    return True
+
+
+def claim_tasks(limit, stale_after):
+    """Забирает задачи из очереди, пропуская занятые другими воркерами."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=stale_after)
+    with transaction.atomic():
+        # Воркер упал на последней попытке: задача больше не вернется.
+        exhausted = ImageTask.objects.filter(
+            status=ImageTask.PROCESSING, started_at__lte=stale,
+            attempts__gte=settings.RECIPE_IMAGE_MAX_ATTEMPTS,
+        )
+        Recipe.objects.filter(
+            Exists(exhausted.filter(recipe=OuterRef('pk')))
+        ).update(image_status=Recipe.IMAGE_FAILED, updated_at=now)
+        exhausted.update(
+            status=ImageTask.FAILED, error='Воркер не завершил обработку'
+        )
+        task_ids = list(
+            ImageTask.objects.select_for_update(skip_locked=True)
+            .filter(
+                status__in=(ImageTask.PENDING, ImageTask.PROCESSING),
+                attempts__lt=settings.RECIPE_IMAGE_MAX_ATTEMPTS,
+            )
+            .exclude(status=ImageTask.PROCESSING, started_at__gt=stale)
+            .values_list('pk', flat=True)[:limit]
+        )
+        ImageTask.objects.filter(pk__in=task_ids).update(
+            status=ImageTask.PROCESSING,
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return task_ids
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from recipes.images import enqueue_missing_renditions
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит в очередь image_worker картинки без уменьшенных копий, '
+        'загруженные в обход API'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        queued = enqueue_missing_renditions(options['batch_size'])
+        self.stdout.write(f'Поставлено в очередь: {queued}')
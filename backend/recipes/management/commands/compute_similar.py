@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import SimilarityTask
+from recipes.similar import (METRICS, Features, compute_all,
+                             process_similarity_tasks)
+
+
+class Command(BaseCommand):
+    help = 'Считает похожие рецепты по ингредиентам и тегам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все рецепты и завершиться'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Процессов для --all'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Рецептов в одном произведении матриц для --all'
+        )
+        parser.add_argument(
+            '--queue-batch-size', type=int, default=100,
+            help='Рецептов из очереди за проход'
+        )
+        parser.add_argument(
+            '--metric', choices=METRICS,
+            default=settings.SIMILAR_RECIPES_METRIC
+        )
+        parser.add_argument(
+            '--top-k', type=int, default=settings.SIMILAR_RECIPES_TOP_K
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help='Через сколько секунд задача зависшего воркера берется снова'
+        )
+        parser.add_argument('--poll-interval', type=float, default=5.0)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            self.compute_all(options)
+            return
+        while True:
+            recipes, rows = process_similarity_tasks(
+                options['queue_batch_size'], options['metric'],
+                options['top_k'], options['stale_after']
+            )
+            if recipes:
+                self.stdout.write(
+                    f'Рецептов из очереди {recipes}, записано похожих {rows}'
+                )
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+    def compute_all(self, options):
+        started = time.monotonic()
+        queued_before = timezone.now()
+        features = Features(options['metric'], options['top_k'])
+        self.stdout.write(
+            f'Векторы {len(features)} рецептов за '
+            f'{time.monotonic() - started:.1f} с'
+        )
+        total = 0
+        for rows in compute_all(
+                features, options['workers'], options['batch_size']):
+            total += rows
+        SimilarityTask.objects.filter(created_at__lte=queued_before).delete()
+        self.stdout.write(
+            f'Записано похожих {total} за {time.monotonic() - started:.1f} с'
+        )
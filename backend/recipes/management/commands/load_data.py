@@ -1,15 +1,120 @@
 import csv
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from recipes.models import Ingredient
 
+from api.cache import invalidate_cache
+
+DEFAULT_PATH = './static/data/ingredients.csv'
+FORMATS = ('csv', 'json')
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0].strip(), row[1].strip()
+
+
+def iter_json_array(file):
+    """Элементы массива JSON по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван или поврежден')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def read_json(file):
+    """Массив объектов или JSON Lines, в обоих случаях потоком."""
+    first = file.read(1)
+    while first.isspace():
+        first = file.read(1)
+    if first == '[':
+        rows = iter_json_array(file)
+    else:
+        file.seek(0)
+        rows = (json.loads(line) for line in file if line.strip())
+    for row in rows:
+        yield row['name'].strip(), row['measurement_unit'].strip()
+
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=DEFAULT_PATH)
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='По умолчанию определяется по расширению файла'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Прочитать файл и посчитать новые строки без записи'
+        )
+
     def handle(self, *args, **options):
-        with open('./static/data/ingredients.csv', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                _, created = Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1],
-                )
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        reader = read_csv if file_format == 'csv' else read_json
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        read = created = 0
+
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            seen = set(
+                Ingredient.objects.values_list('name', 'measurement_unit')
+            )
+            rows = reader(file)
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+                read += len(chunk)
+                batch = []
+                for key in chunk:
+                    if key[0] and key not in seen:
+                        seen.add(key)
+                        batch.append(Ingredient(
+                            name=key[0], measurement_unit=key[1]
+                        ))
+                created += len(batch)
+                if batch and not options['dry_run']:
+                    # Строки, добавленные параллельно, отсекает
+                    # ограничение unique_ingredient.
+                    Ingredient.objects.bulk_create(
+                        batch, batch_size=batch_size, ignore_conflicts=True
+                    )
+
+        if created and not options['dry_run']:
+            invalidate_cache('ingredients')
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'Прочитано {read}, новых {created}'
+            f'{" (dry-run)" if options["dry_run"] else ""} '
+            f'за {elapsed:.2f} с ({read / elapsed if elapsed else read:.0f} '
+            'строк/с)'
+        )
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.feed import process_feed_tasks, process_prune_tasks
+
+
+class Command(BaseCommand):
+    help = 'Раскладывает новые рецепты по лентам и чистит их после отписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            tasks, entries = process_feed_tasks(options['batch_size'])
+            if tasks:
+                self.stdout.write(
+                    f'Рецептов {tasks}, записей в лентах {entries}'
+                )
+            prunes, deleted = process_prune_tasks(options['batch_size'])
+            if prunes:
+                self.stdout.write(
+                    f'Отписок {prunes}, удалено записей {deleted}'
+                )
+            if tasks or prunes:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from recipes.images import claim_tasks, process_image_task
+
+
+def run_task(task_id):
+    try:
+        return process_image_task(task_id)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь загруженных картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument(
+            '--pool', choices=('thread', 'process'), default='thread',
+            help='Pillow отпускает GIL при кодировании, потоков обычно хватает'
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help='Через сколько секунд задача зависшего воркера берется снова'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        pool_class = (
+            ProcessPoolExecutor if options['pool'] == 'process'
+            else ThreadPoolExecutor
+        )
+        with pool_class(max_workers=workers) as pool:
+            while True:
+                task_ids = claim_tasks(workers * 2, options['stale_after'])
+                # Дочерние процессы не должны унаследовать открытое соединение.
+                connections.close_all()
+                if task_ids:
+                    done = sum(pool.map(run_task, task_ids))
+                    self.stdout.write(
+                        f'Обработано {done} из {len(task_ids)}'
+                    )
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
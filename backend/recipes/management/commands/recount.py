@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import FavoriteRecipe, Recipe
+from users.models import Follow, User
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+COUNTERS = (
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики рецептов, подписчиков и избранного'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in COUNTERS:
+            drifted = model.objects.annotate(
+                actual=count_subquery(related_model, field)
+            ).exclude(**{counter: F('actual')}).values('pk')
+            updated = model.objects.filter(pk__in=drifted).update(
+                **{counter: count_subquery(related_model, field)}
+            )
+            self.stdout.write(
+                f'{model.__name__}.{counter}: исправлено {updated}'
+            )
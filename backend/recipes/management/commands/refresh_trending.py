@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.trending import refresh
+
+
+class Command(BaseCommand):
+    help = 'Обновляет рейтинг популярных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать все рецепты с событиями за горизонт затухания'
+        )
+        parser.add_argument('--poll-interval', type=float, default=60.0)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обновить один раз и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        full = options['rebuild']
+        while True:
+            recipes, pruned = refresh(full)
+            full = False
+            if recipes or pruned:
+                self.stdout.write(
+                    f'Пересчитано рецептов {recipes}, удалено затухших {pruned}'
+                )
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
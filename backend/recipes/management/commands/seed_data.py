@@ -0,0 +1,266 @@
+import io
+import random
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+from recipes.images import render_image, save_file
+from recipes.models import (FavoriteRecipe, FeedEntry, Ingredient,
+                            IngredientInRecipe, Recipe, ShoppingCart, Tag)
+from users.models import Follow, User
+
+PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2C94C', 'dessert'),
+    ('Постное', '#56CCF2', 'lenten'),
+)
+DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Каша', 'Рагу', 'Запеканка', 'Омлет',
+    'Паста', 'Плов', 'Оладьи', 'Котлеты', 'Соус',
+)
+
+
+def last_pk(model):
+    return (
+        model.objects.order_by('-pk').values_list('pk', flat=True).first()
+        or 0
+    )
+
+
+def new_pks(queryset, start):
+    """bulk_create на SQLite не возвращает pk, берем их запросом."""
+    return list(
+        queryset.filter(pk__gt=start).order_by('pk')
+        .values_list('pk', flat=True)
+    )
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для benchmarks/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок на пользователя')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='Рецептов в избранном на пользователя')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='Рецептов в корзине на пользователя')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить данные прошлого заполнения'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                username__startswith=PREFIX
+            ).delete()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError('Данные уже есть, запустите с --clear')
+        if not Ingredient.objects.exists():
+            call_command('load_data', stdout=self.stdout)
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Нет ингредиентов для рецептов')
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)[:1000]
+        )
+
+        with transaction.atomic():
+            tag_ids = self.create_tags()
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                user_ids, tag_ids, ingredient_ids, options
+            )
+            self.create_links(
+                Follow, 'user_id', 'author_id', user_ids, user_ids,
+                options['follows']
+            )
+            self.create_links(
+                FavoriteRecipe, 'user_id', 'recipe_id', user_ids, recipe_ids,
+                options['favorites']
+            )
+            self.create_links(
+                ShoppingCart, 'user_id', 'recipe_id', user_ids, recipe_ids,
+                options['cart']
+            )
+            self.create_feed()
+        call_command('recount', stdout=self.stdout)
+        call_command(
+            'refresh_trending', '--rebuild', '--once', stdout=self.stdout
+        )
+        self.stdout.write(
+            f'Пользователей {len(user_ids)}, рецептов {len(recipe_ids)} '
+            f'за {time.monotonic() - started:.1f} с'
+        )
+
+    def bulk_create(self, model, objects, ignore_conflicts=False):
+        """Пачками, не собирая весь генератор в память."""
+        objects = iter(objects)
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            model.objects.bulk_create(
+                batch, ignore_conflicts=ignore_conflicts
+            )
+
+    def create_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def create_users(self, total):
+        start = last_pk(User)
+        password = make_password(PASSWORD)
+        self.bulk_create(
+            User,
+            (
+                User(
+                    username=f'{PREFIX}{number}',
+                    email=f'{PREFIX}{number}@example.com',
+                    first_name='Bench', last_name=str(number),
+                    password=password,
+                )
+                for number in range(total)
+            ),
+        )
+        return new_pks(User.objects, start)
+
+    def create_image(self):
+        """Одна общая картинка с готовыми копиями для всех рецептов."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (1280, 960), '#E26C2D').save(buffer, 'JPEG')
+        files, renditions = render_image(buffer, 'recipes/seed')
+        original = save_file('recipes/seed/original.jpg', buffer.getvalue())
+        saved = {
+            name: save_file(name, content) for name, content in files.items()
+        }
+        return original, {
+            key: {width: saved[name] for width, name in sizes.items()}
+            for key, sizes in renditions.items()
+        }
+
+    def recipe_name(self, number):
+        dish = self.random.choice(DISHES)
+        ingredient = self.random.choice(self.ingredient_names)
+        return f'{dish} с {ingredient} №{number}'[:200]
+
+    def recipe_text(self):
+        ingredients = self.random.sample(
+            self.ingredient_names, min(5, len(self.ingredient_names))
+        )
+        return (
+            f'{self.random.choice(DISHES)}: смешать {", ".join(ingredients)} '
+            'и готовить до готовности.'
+        )[:1000]
+
+    def create_recipes(self, user_ids, tag_ids, ingredient_ids, options):
+        start = last_pk(Recipe)
+        image, renditions = self.create_image()
+        self.bulk_create(
+            Recipe,
+            (
+                Recipe(
+                    author_id=self.random.choice(user_ids),
+                    name=self.recipe_name(number),
+                    text=self.recipe_text(),
+                    cooking_time=self.random.randint(1, 180),
+                    image=image,
+                    image_renditions=renditions,
+                )
+                for number in range(options['recipes'])
+            ),
+        )
+        recipe_ids = new_pks(Recipe.objects, start)
+        per_recipe = min(
+            options['ingredients_per_recipe'], len(ingredient_ids)
+        )
+        self.bulk_create(
+            Recipe.tags.through,
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, min(3, len(tag_ids)))
+                )
+            ),
+        )
+        self.bulk_create(
+            IngredientInRecipe,
+            (
+                IngredientInRecipe(
+                    recipe_id=recipe_id, ingredients_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.random.sample(
+                    ingredient_ids, per_recipe
+                )
+            ),
+        )
+        return recipe_ids
+
+    def create_feed(self):
+        """Ленты, как после backfill_feed для каждой подписки."""
+        latest = defaultdict(list)
+        recipes = Recipe.objects.filter(
+            author__username__startswith=PREFIX
+        ).order_by('author_id', '-id').values_list('author_id', 'id')
+        for author_id, recipe_id in recipes.iterator():
+            if len(latest[author_id]) < settings.FEED_BACKFILL_RECIPES:
+                latest[author_id].append(recipe_id)
+        follows = list(Follow.objects.filter(
+            user__username__startswith=PREFIX
+        ).values_list('user_id', 'author_id'))
+        self.bulk_create(
+            FeedEntry,
+            (
+                FeedEntry(
+                    user_id=user_id, recipe_id=recipe_id, author_id=author_id
+                )
+                for user_id, author_id in follows
+                for recipe_id in latest[author_id]
+            ),
+            ignore_conflicts=True,
+        )
+
+    def create_links(self, model, owner_field, target_field, owner_ids,
+                     target_ids, per_owner):
+        """Случайные уникальные пары владелец-цель без самоподписок."""
+        def links():
+            for owner_id in owner_ids:
+                targets = self.random.sample(
+                    target_ids, min(per_owner + 1, len(target_ids))
+                )
+                targets = [
+                    target_id for target_id in targets
+                    if model is not Follow or target_id != owner_id
+                ][:per_owner]
+                for target_id in targets:
+                    yield model(
+                        **{owner_field: owner_id, target_field: target_id}
+                    )
+
+        self.bulk_create(model, links(), ignore_conflicts=True)
@@ -0,0 +1,59 @@
+# Generated by Django 3.1.4 on 2026-10-18 03:07
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+
+
+def delete_duplicates(model, fields):
+    """Оставляет первую запись в каждой группе одним DELETE.
+
+    DELETE ... WHERE id NOT IN (SELECT MIN(id) ... GROUP BY fields).
+    """
+    first_ids = (
+        model.objects.order_by().values(*fields)
+        .annotate(first_id=Min('id')).values('first_id')
+    )
+    model.objects.exclude(id__in=first_ids).delete()
+
+
+def duplicated(model, fields, field):
+    """Значения field в группах с повторами, подзапросом."""
+    return (
+        model.objects.order_by().values(*fields)
+        .annotate(total=Count('id')).filter(total__gt=1).values(field)
+    )
+
+
+def remove_duplicates(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FavoriteRecipe = apps.get_model('recipes', 'FavoriteRecipe')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    # Счетчик до удаления: число разных пользователей и есть итог.
+    Recipe.objects.filter(
+        id__in=duplicated(FavoriteRecipe, ('user', 'recipe'), 'recipe')
+    ).update(favorites_count=Subquery(
+        FavoriteRecipe.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(total=Count('user', distinct=True))
+        .values('total')
+    ))
+    delete_duplicates(FavoriteRecipe, ('user', 'recipe'))
+    delete_duplicates(ShoppingCart, ('user', 'recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_favorites_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favoriterecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart_recipe'),
+        ),
+    ]
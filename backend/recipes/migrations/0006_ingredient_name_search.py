@@ -0,0 +1,36 @@
+from django.db import migrations
+
+CREATE_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix '
+    'ON recipes_ingredient (UPPER(name::text) text_pattern_ops);',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops);',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipes_ingredient_name_prefix;',
+    'DROP INDEX IF EXISTS recipes_ingredient_name_trgm;',
+)
+
+
+def run_postgresql(statements):
+    """Индексы по выражениям есть только у PostgreSQL."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_unique_user_recipe'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_postgresql(CREATE_INDEXES), run_postgresql(DROP_INDEXES)
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.1.4 on 2026-10-18 03:27
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('pg_catalog.russian', coalesce({0}name, '')), 'A')"
+    " || setweight(to_tsvector('pg_catalog.russian', "
+    "coalesce({0}text, '')), 'B')"
+)
+CREATE_SEARCH = (
+    'CREATE OR REPLACE FUNCTION recipes_recipe_search_vector() '
+    'RETURNS trigger AS $$ BEGIN '
+    'NEW.search_vector := {}; RETURN NEW; '
+    'END $$ LANGUAGE plpgsql;'.format(SEARCH_VECTOR.format('NEW.')),
+    'CREATE TRIGGER recipes_recipe_search_vector_update '
+    'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+    'FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector();',
+    'UPDATE recipes_recipe SET search_vector = {};'.format(
+        SEARCH_VECTOR.format('')
+    ),
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+    'ON recipes_recipe USING gin (search_vector);',
+)
+DROP_SEARCH = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector;',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_update '
+    'ON recipes_recipe;',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector();',
+)
+
+
+def run_postgresql(statements):
+    """Триггер обновляет вектор и при bulk_create, и при update()."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_image_tasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_postgresql(CREATE_SEARCH), run_postgresql(DROP_SEARCH)
+        ),
+    ]
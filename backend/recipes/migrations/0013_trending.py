@@ -0,0 +1,48 @@
+# Generated by Django 3.1.4 on 2026-10-18 03:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingRecipe',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe')),
+                ('score', models.FloatField(db_index=True, verbose_name='Популярность')),
+            ],
+            options={
+                'verbose_name': 'Популярный рецепт',
+                'verbose_name_plural': 'Популярные рецепты',
+                'ordering': ('-score',),
+            },
+        ),
+        # Существующие записи остаются без даты, а не получают время миграции.
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='created_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='favoriterecipe',
+            name='created_at',
+            field=models.DateTimeField(blank=True, db_index=True, default=django.utils.timezone.now, null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AlterField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(blank=True, db_index=True, default=django.utils.timezone.now, null=True, verbose_name='Дата добавления'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.4 on 2026-10-18 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_author_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similaritytask',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Начата'),
+        ),
+    ]
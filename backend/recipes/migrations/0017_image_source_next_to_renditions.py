@@ -0,0 +1,19 @@
+# Generated by Django 3.1.4 on 2026-10-18 04:19
+
+from django.db import migrations, models
+import recipes.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_feed_prune_task'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagetask',
+            name='source',
+            field=models.FileField(upload_to=recipes.models.image_source_path, verbose_name='Исходный файл'),
+        ),
+    ]
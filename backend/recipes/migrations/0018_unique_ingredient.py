@@ -0,0 +1,52 @@
+# Generated by Django 3.1.4 on 2026-10-18 04:22
+
+from django.db import migrations, models
+from django.db.models import Case, Count, Min, Value, When
+
+
+def merge_duplicates(apps, schema_editor):
+    """Связи с повторами ингредиента переходят на первый, повторы удаляются.
+
+    Одним UPDATE и одним DELETE, как в 0005.
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    groups = (
+        Ingredient.objects.order_by().values('name', 'measurement_unit')
+        .annotate(first_id=Min('id'), total=Count('id'))
+    )
+    first_ids = {
+        (group['name'], group['measurement_unit']): group['first_id']
+        for group in groups.filter(total__gt=1)
+    }
+    if not first_ids:
+        return
+    extra = {
+        pk: first_ids[(name, unit)]
+        for pk, name, unit in Ingredient.objects.filter(
+            name__in={name for name, _ in first_ids}
+        ).values_list('id', 'name', 'measurement_unit')
+        if first_ids.get((name, unit), pk) != pk
+    }
+    IngredientInRecipe.objects.filter(ingredients_id__in=extra).update(
+        ingredients_id=Case(
+            *(When(ingredients_id=pk, then=Value(first))
+              for pk, first in extra.items()),
+        )
+    )
+    Ingredient.objects.exclude(id__in=groups.values('first_id')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_image_source_next_to_renditions'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -1,5 +1,7 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 from users.models import User
 
 from .validators import slug_validation
@@ -47,12 +49,27 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient',
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
 class Recipe(models.Model):
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готова'),
+        (IMAGE_FAILED, 'Ошибка'),
+    )
+
     name = models.CharField(
         'Название рецепта',
         max_length=200,
@@ -83,6 +100,18 @@ class Recipe(models.Model):
         upload_to='recipes/',
         max_length=10485760
     )
+    image_status = models.CharField(
+        'Статус картинки',
+        max_length=16,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+    )
+    image_renditions = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     is_favorited = models.BooleanField(
         'В избранном',
         blank=True,
@@ -100,11 +129,33 @@ class Recipe(models.Model):
             MaxValueValidator(10000)
         ]
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True,
+    )
+    # Заполняется триггером PostgreSQL, см. миграцию 0009.
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = (
+            # Последние рецепты автора: подписки и ленты.
+            models.Index(
+                fields=('author', '-id'), name='recipe_author_id_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -144,10 +195,25 @@ class FavoriteRecipe(models.Model):
         Recipe,
         on_delete=models.CASCADE
     )
+    # Пусто у записей, добавленных до появления поля: их время неизвестно,
+    # и в рейтинг популярных они не попадают.
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        null=True,
+        blank=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Избранное'
         ordering = ('user_id',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite_recipe',
+            ),
+        )
 
 
 class ShoppingCart(models.Model):
@@ -159,7 +225,202 @@ class ShoppingCart(models.Model):
         Recipe,
         on_delete=models.CASCADE
     )
+    # Пусто у записей, добавленных до появления поля: их время неизвестно,
+    # и в рейтинг популярных они не попадают.
+    created_at = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        null=True,
+        blank=True,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
         ordering = ('user_id',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart_recipe',
+            ),
+        )
+
+
+def image_source_path(task, filename):
+    """Оригинал лежит рядом с копиями рецепта, см. recipes.images."""
+    return f'recipes/{task.recipe_id}/{filename}'
+
+
+class ImageTask(models.Model):
+    """Очередь обработки загруженных картинок рецептов."""
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (FAILED, 'Ошибка'),
+    )
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_tasks',
+        verbose_name='Рецепт',
+    )
+    source = models.FileField(
+        'Исходный файл',
+        upload_to=image_source_path,
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    error = models.TextField('Ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    started_at = models.DateTimeField('Начата', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Обработка картинки'
+        verbose_name_plural = 'Обработка картинок'
+        ordering = ('id',)
+        indexes = (
+            models.Index(fields=('status', 'id'), name='image_task_queue'),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.status}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика, раскладывается воркером process_feed."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        ordering = ('-recipe_id',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        )
+
+
+class FeedTask(models.Model):
+    """Очередь раскладки новых рецептов по лентам подписчиков."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_tasks',
+        verbose_name='Рецепт',
+    )
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Раскладка по лентам'
+        verbose_name_plural = 'Раскладка по лентам'
+        ordering = ('id',)
+
+
+class FeedPruneTask(models.Model):
+    """Очередь чистки ленты от рецептов автора после отписки."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Чистка ленты'
+        verbose_name_plural = 'Чистка лент'
+        ordering = ('id',)
+
+
+class SimilarRecipe(models.Model):
+    """Похожий рецепт, считается командой compute_similar."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('-score',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe',
+            ),
+        )
+
+
+class SimilarityTask(models.Model):
+    """Очередь пересчета похожих для созданных и измененных рецептов."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarity_tasks',
+        verbose_name='Рецепт',
+    )
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    started_at = models.DateTimeField('Начата', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Пересчет похожих'
+        verbose_name_plural = 'Пересчет похожих'
+        ordering = ('id',)
+
+
+class TrendingRecipe(models.Model):
+    """Рейтинг популярных рецептов, см. recipes/trending.py.
+
+    score — log2 суммы весов событий с прямым затуханием от TRENDING_EPOCH,
+    поэтому старые строки не нужно пересчитывать при новых событиях.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trending',
+    )
+    score = models.FloatField('Популярность', db_index=True)
+
+    class Meta:
+        verbose_name = 'Популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+        ordering = ('-score',)
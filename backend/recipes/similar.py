@@ -0,0 +1,365 @@
+import multiprocessing
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+from scipy import sparse
+
+from .models import IngredientInRecipe, Recipe, SimilarityTask, SimilarRecipe
+
+METRICS = ('cosine', 'jaccard')
+# Признак частый, если встречается больше чем в SIMILAR_RECIPES_MAX_DF
+# доле рецептов и не меньше чем в стольких рецептах.
+COMMON_MIN_RECIPES = 1000
+IN_CHUNK_SIZE = 1000
+STATS_KEY = 'similar:feature_stats'
+
+# Признаки для процессов пула, достаются им при fork.
+_features = None
+
+
+def chunks(values, size=IN_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def load_pairs(queryset, recipe_ids=None):
+    """Пары (рецепт, признак): все или только рецептов recipe_ids."""
+    if recipe_ids is None:
+        querysets = [queryset]
+    else:
+        querysets = [
+            queryset.filter(recipe_id__in=chunk)
+            for chunk in chunks(sorted(recipe_ids))
+        ]
+    flat = np.fromiter(
+        (
+            value for part in querysets
+            for pair in part.iterator() for value in pair
+        ),
+        dtype=np.int64,
+    )
+    return flat[0::2], flat[1::2]
+
+
+def feature_codes(ingredients, tags):
+    """Четные коды — ингредиенты, нечетные — теги."""
+    return np.concatenate((ingredients * 2, tags * 2 + 1))
+
+
+def count_pairs(queryset):
+    pairs = np.array(list(queryset), dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def feature_stats():
+    """Сколько рецептов с каждым признаком и всего рецептов.
+
+    Нужны, чтобы делить признаки на редкие и частые без загрузки всех
+    векторов. Меняются медленно, поэтому кэшируются.
+    """
+    stats = cache.get(STATS_KEY)
+    if stats is None:
+        ingredients, ingredient_counts = count_pairs(
+            IngredientInRecipe.objects.order_by().values('ingredients_id')
+            .annotate(total=Count('recipe_id', distinct=True))
+            .values_list('ingredients_id', 'total')
+        )
+        tags, tag_counts = count_pairs(
+            Recipe.tags.through.objects.order_by().values('tag_id')
+            .annotate(total=Count('pk')).values_list('tag_id', 'total')
+        )
+        stats = save_feature_stats(
+            feature_codes(ingredients, tags),
+            np.concatenate((ingredient_counts, tag_counts)),
+            IngredientInRecipe.objects.order_by().values('recipe_id')
+            .distinct().count(),
+        )
+    return stats
+
+
+def save_feature_stats(codes, counts, total):
+    stats = (dict(zip(codes.tolist(), counts.tolist())), total)
+    cache.set(STATS_KEY, stats, settings.SIMILAR_RECIPES_STATS_TIMEOUT)
+    return stats
+
+
+class Features:
+    """Разреженные векторы рецептов из ингредиентов и тегов.
+
+    Пары кандидатов находит произведение матриц по редким признакам.
+    Частые признаки (теги, соль) добавляются к сходству только для
+    найденных пар: в произведении каждая строка задела бы большую часть
+    рецептов.
+
+    С recipe_ids загружаются только эти рецепты, частота признаков
+    берется из feature_stats. Полные списки похожих тогда верны лишь
+    для рецептов, чьи кандидаты тоже загружены, см. neighbourhood.
+    """
+    def __init__(self, metric=None, top_k=None, recipe_ids=None):
+        self.metric = metric or settings.SIMILAR_RECIPES_METRIC
+        self.top_k = top_k or settings.SIMILAR_RECIPES_TOP_K
+        if self.metric not in METRICS:
+            raise ValueError(f'Неизвестная метрика {self.metric}')
+        ingredient_recipes, ingredients = load_pairs(
+            IngredientInRecipe.objects.order_by()
+            .values_list('recipe_id', 'ingredients_id').distinct(),
+            recipe_ids,
+        )
+        tag_recipes, tags = load_pairs(
+            Recipe.tags.through.objects.order_by()
+            .values_list('recipe_id', 'tag_id'),
+            recipe_ids,
+        )
+        self.recipe_ids = np.unique(ingredient_recipes)
+        keep = np.isin(tag_recipes, self.recipe_ids)
+        tag_recipes, tags = tag_recipes[keep], tags[keep]
+
+        rows = np.searchsorted(
+            self.recipe_ids, np.concatenate((ingredient_recipes, tag_recipes))
+        )
+        codes, columns = np.unique(
+            feature_codes(ingredients, tags), return_inverse=True
+        )
+        weights = np.ones(len(rows), dtype=np.float32)
+        if self.metric == 'cosine':
+            weights[len(ingredients):] = settings.SIMILAR_RECIPES_TAG_WEIGHT
+        size = len(self.recipe_ids)
+        matrix = sparse.csr_matrix(
+            (weights, (rows, columns)),
+            shape=(size, columns.max() + 1 if len(columns) else 0),
+        )
+        if self.metric == 'cosine':
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)))
+            matrix = sparse.csr_matrix(matrix.multiply(1 / norms.clip(1e-9)))
+        self.sizes = np.bincount(rows, minlength=size).astype(np.float32)
+
+        if recipe_ids is None:
+            frequency = np.bincount(columns, minlength=matrix.shape[1])
+            total = size
+            save_feature_stats(codes, frequency, total)
+        else:
+            counts, total = feature_stats()
+            frequency = np.array(
+                [counts.get(code, 0) for code in codes.tolist()],
+                dtype=np.int64,
+            )
+        common = (
+            (frequency > settings.SIMILAR_RECIPES_MAX_DF * total)
+            & (frequency >= COMMON_MIN_RECIPES)
+        )
+        self.rare_codes = codes[~common]
+        self.rare = matrix[:, np.flatnonzero(~common)].tocsr()
+        self.rare_transposed = self.rare.T.tocsr()
+        self.common = matrix[:, np.flatnonzero(common)].toarray()
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def positions(self, recipe_ids):
+        """Строки матрицы для id, рецепты без ингредиентов пропускаются."""
+        recipe_ids = np.unique(np.asarray(list(recipe_ids), np.int64))
+        found = np.searchsorted(self.recipe_ids, recipe_ids).clip(
+            0, max(len(self) - 1, 0)
+        )
+        if not len(self):
+            return found[:0]
+        return found[self.recipe_ids[found] == recipe_ids]
+
+    def score(self, positions):
+        """Все пары (строка, строка) с общим редким признаком и сходство."""
+        block = (self.rare[positions] @ self.rare_transposed).tocoo()
+        rows, columns = positions[block.row], block.col
+        keep = rows != columns
+        rows, columns = rows[keep], columns[keep]
+        values = block.data[keep]
+        if self.common.shape[1]:
+            values = values + (
+                self.common[rows] * self.common[columns]
+            ).sum(axis=1)
+        if self.metric == 'jaccard':
+            values = values / (self.sizes[rows] + self.sizes[columns] - values)
+        return rows, columns, values
+
+    def neighbours(self, positions):
+        """top_k похожих для строк: id рецепта, id похожего и сходство."""
+        return self.top(*self.score(positions))
+
+    def top(self, rows, columns, values):
+        order = np.lexsort((-columns, -values, rows))
+        rows, columns, values = rows[order], columns[order], values[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        keep = rank < self.top_k
+        return (
+            self.recipe_ids[rows[keep]],
+            self.recipe_ids[columns[keep]],
+            values[keep],
+        )
+
+
+def neighbours_batch(positions):
+    return _features.neighbours(positions)
+
+
+def save_similar(recipe_ids, result):
+    """Заменяет похожие рецептов recipe_ids на result."""
+    objects = [
+        SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id, score=score)
+        for recipe_id, similar_id, score in zip(
+            *(column.tolist() for column in result)
+        )
+    ]
+    with transaction.atomic():
+        for chunk in chunks(sorted(recipe_ids)):
+            # Воркеры, пересчитывающие те же рецепты, ждут друг друга.
+            list(
+                Recipe.objects.select_for_update().filter(pk__in=chunk)
+                .order_by('pk').values_list('pk', flat=True)
+            )
+            SimilarRecipe.objects.filter(recipe_id__in=chunk).delete()
+        SimilarRecipe.objects.bulk_create(objects, batch_size=5000)
+    return len(objects)
+
+
+def compute_all(features, workers=1, batch_size=500):
+    """Пересчитывает похожие для всех рецептов, пачками по batch_size.
+
+    Пачки считаются в workers процессах, записывает результаты
+    родительский процесс. Возвращает генератор числа записанных строк.
+    """
+    global _features
+    _features = features
+    batches = [
+        np.arange(start, min(start + batch_size, len(features)))
+        for start in range(0, len(features), batch_size)
+    ]
+    if workers > 1:
+        # Соединение с базой не должно достаться дочерним процессам.
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            results = pool.imap(neighbours_batch, batches)
+            for batch, result in zip(batches, results):
+                yield save_similar(
+                    features.recipe_ids[batch].tolist(), result
+                )
+    else:
+        for batch in batches:
+            yield save_similar(
+                features.recipe_ids[batch].tolist(),
+                features.neighbours(batch),
+            )
+
+
+def affected_recipes(features, changed_ids, columns, values):
+    """Рецепты, в чьих списках должен появиться или исчезнуть измененный."""
+    affected = set()
+    for chunk in chunks(changed_ids):
+        affected.update(
+            SimilarRecipe.objects.filter(similar_id__in=chunk)
+            .values_list('recipe_id', flat=True)
+        )
+    best = {}
+    for column, value in zip(columns.tolist(), values.tolist()):
+        best[column] = max(value, best.get(column, 0))
+    candidates = dict(zip(features.recipe_ids[list(best)].tolist(),
+                          best.values()))
+    full = set()
+    for chunk in chunks(candidates):
+        for recipe_id, count, lowest in (
+            SimilarRecipe.objects.filter(recipe_id__in=chunk)
+            .order_by().values('recipe_id')
+            .annotate(count=Count('pk'), lowest=Min('score'))
+            .values_list('recipe_id', 'count', 'lowest')
+        ):
+            full.add(recipe_id)
+            if count < features.top_k or candidates[recipe_id] >= lowest:
+                affected.add(recipe_id)
+    # Рецепты без сохраненных похожих тоже принимают новый рецепт.
+    affected.update(set(candidates) - full)
+    return affected - set(changed_ids)
+
+
+def neighbourhood(recipe_ids, metric=None, top_k=None):
+    """Признаки рецептов recipe_ids и всех рецептов с общим редким признаком.
+
+    Этого хватает, чтобы посчитать полные списки похожих для recipe_ids.
+    """
+    targets = Features(metric, top_k, recipe_ids)
+    codes = targets.rare_codes
+    candidates = set(recipe_ids)
+    for model, field, values in (
+        (IngredientInRecipe, 'ingredients_id', codes[codes % 2 == 0] // 2),
+        (Recipe.tags.through, 'tag_id', codes[codes % 2 == 1] // 2),
+    ):
+        for chunk in chunks(values.tolist()):
+            candidates.update(
+                model.objects.filter(**{f'{field}__in': chunk}).order_by()
+                .values_list('recipe_id', flat=True).distinct()
+            )
+    return Features(metric, top_k, candidates)
+
+
+def update_similar(changed_ids, metric=None, top_k=None):
+    """Пересчитывает измененные рецепты и тех, на кого они влияют.
+
+    Загружаются векторы только этих рецептов и их кандидатов.
+    """
+    features = neighbourhood(changed_ids, metric, top_k)
+    _, columns, values = features.score(features.positions(changed_ids))
+    affected = affected_recipes(features, changed_ids, columns, values)
+    recipe_ids = set(changed_ids) | affected
+    if affected:
+        features = neighbourhood(recipe_ids, metric, top_k)
+    return save_similar(
+        list(recipe_ids), features.neighbours(features.positions(recipe_ids))
+    )
+
+
+def enqueue_similar(recipe):
+    SimilarityTask.objects.create(recipe=recipe)
+
+
+def enqueue_similar_ids(recipe_ids):
+    """Ставит в очередь рецепты, которые еще существуют."""
+    SimilarityTask.objects.bulk_create(
+        SimilarityTask(recipe_id=recipe_id)
+        for recipe_id in Recipe.objects.filter(pk__in=list(recipe_ids))
+        .values_list('pk', flat=True)
+    )
+
+
+def claim_similarity_tasks(limit, stale_after):
+    """Забирает задачи, пропуская занятые другими воркерами."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=stale_after)
+    with transaction.atomic():
+        tasks = list(
+            SimilarityTask.objects.select_for_update(skip_locked=True)
+            .filter(Q(started_at__isnull=True) | Q(started_at__lte=stale))
+            .values_list('pk', 'recipe_id')[:limit]
+        )
+        SimilarityTask.objects.filter(
+            pk__in=[pk for pk, _ in tasks]
+        ).update(started_at=now)
+    return tasks
+
+
+def process_similarity_tasks(limit, metric=None, top_k=None,
+                             stale_after=600):
+    """Пересчитывает похожие для рецептов из очереди.
+
+    Задачи удаляются после записи результата, задачу упавшего воркера
+    через stale_after секунд возьмет другой.
+    """
+    tasks = claim_similarity_tasks(limit, stale_after)
+    if not tasks:
+        return 0, 0
+    changed_ids = {recipe_id for _, recipe_id in tasks}
+    rows = update_similar(changed_ids, metric, top_k)
+    SimilarityTask.objects.filter(pk__in=[pk for pk, _ in tasks]).delete()
+    return len(changed_ids), rows
@@ -0,0 +1,129 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import FavoriteRecipe, ShoppingCart, TrendingRecipe
+
+# Начало отсчета прямого затухания: событие в момент t весит
+# 2 ** ((t - TRENDING_EPOCH) / half_life), так что порядок рецептов
+# совпадает с порядком по затухающей сумме на любой момент.
+TRENDING_EPOCH = datetime(2023, 1, 1, tzinfo=dt_timezone.utc)
+# Поздно закоммиченные события попадают в следующее обновление.
+REFRESH_OVERLAP = timedelta(seconds=60)
+REFRESHED_AT_KEY = 'trending:refreshed_at'
+CHUNK_SIZE = 500
+# log2 нулевого веса для строки, созданной до первого события.
+EMPTY_SCORE = -1e9
+
+
+def exponent(moment):
+    """log2 веса события в момент moment."""
+    return (moment - TRENDING_EPOCH).total_seconds() / (
+        settings.TRENDING_HALF_LIFE_HOURS * 3600
+    )
+
+
+def event_weights():
+    return (
+        (FavoriteRecipe, settings.TRENDING_FAVORITE_WEIGHT),
+        (ShoppingCart, settings.TRENDING_CART_WEIGHT),
+    )
+
+
+def add_event(recipe_id, weight, moment):
+    """Сразу меняет рейтинг рецепта, не дожидаясь refresh_trending.
+
+    Отрицательный вес убирает событие, добавленное в момент moment.
+    Записи без даты в рейтинге не учтены, их moment — None.
+    """
+    if moment is None:
+        return
+    value = math.log2(abs(weight)) + exponent(moment)
+    with transaction.atomic():
+        if weight > 0:
+            TrendingRecipe.objects.bulk_create(
+                [TrendingRecipe(recipe_id=recipe_id, score=EMPTY_SCORE)],
+                ignore_conflicts=True,
+            )
+        row = TrendingRecipe.objects.select_for_update().filter(
+            recipe_id=recipe_id
+        ).first()
+        if row is None:
+            return
+        high, low = max(row.score, value), min(row.score, value)
+        if weight > 0:
+            row.score = high + math.log2(1 + 2 ** (low - high))
+        else:
+            remaining = 1 - 2 ** min(value - row.score, 0)
+            if remaining < 1e-9:
+                row.delete()
+                return
+            row.score += math.log2(remaining)
+        row.save(update_fields=('score',))
+
+
+def recipe_scores(recipe_ids, since, now):
+    """Рейтинг рецептов по событиям после since, события по часам."""
+    base = exponent(now)
+    totals = defaultdict(float)
+    for model, weight in event_weights():
+        for recipe_id, hour, count in (
+            model.objects.filter(recipe_id__in=recipe_ids, created_at__gte=since)
+            .annotate(hour=TruncHour('created_at')).order_by()
+            .values('recipe_id', 'hour').annotate(count=Count('pk'))
+            .values_list('recipe_id', 'hour', 'count')
+        ):
+            # Считаем от текущего момента, чтобы 2 ** x не переполнялось.
+            totals[recipe_id] += weight * count * 2 ** (
+                exponent(hour + timedelta(minutes=30)) - base
+            )
+    return {
+        recipe_id: math.log2(total) + base
+        for recipe_id, total in totals.items() if total > 0
+    }
+
+
+def refresh(full=False):
+    """Пересчитывает рецепты с событиями после прошлого обновления.
+
+    Удаляет рецепты, чей рейтинг затух ниже TRENDING_MIN_SCORE.
+    Возвращает число пересчитанных и удаленных рецептов.
+    """
+    now = timezone.now()
+    horizon = now - timedelta(
+        hours=settings.TRENDING_HALF_LIFE_HOURS
+        * settings.TRENDING_HORIZON_HALF_LIVES
+    )
+    refreshed_at = None if full else cache.get(REFRESHED_AT_KEY)
+    start = horizon
+    if refreshed_at is not None:
+        start = max(refreshed_at - REFRESH_OVERLAP, horizon)
+    recipe_ids = set()
+    for model, _ in event_weights():
+        recipe_ids.update(
+            model.objects.filter(created_at__gte=start).order_by()
+            .values_list('recipe_id', flat=True).distinct()
+        )
+    recipe_ids = sorted(recipe_ids)
+    for offset in range(0, len(recipe_ids), CHUNK_SIZE):
+        chunk = recipe_ids[offset:offset + CHUNK_SIZE]
+        scores = recipe_scores(chunk, horizon, now)
+        with transaction.atomic():
+            TrendingRecipe.objects.filter(recipe_id__in=chunk).delete()
+            TrendingRecipe.objects.bulk_create(
+                TrendingRecipe(recipe_id=recipe_id, score=score)
+                for recipe_id, score in scores.items()
+            )
+    pruned, _ = TrendingRecipe.objects.filter(
+        score__lt=math.log2(settings.TRENDING_MIN_SCORE) + exponent(now)
+    ).delete()
+    cache.set(REFRESHED_AT_KEY, now, None)
+    return len(recipe_ids), pruned
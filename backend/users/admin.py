@@ -11,7 +11,10 @@ class UserAdmin(admin.ModelAdmin):
         'email',
         'first_name',
         'last_name',
+        'recipes_count',
+        'followers_count',
     )
+    readonly_fields = ('recipes_count', 'followers_count')
     search_fields = ('username', 'email',)
     list_filter = ('username',)
     empty_value_display = 'пусто'
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.4 on 2026-10-18 03:07
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляет первую подписку в каждой паре одним DELETE.
+
+    followers_count пересчитывается до удаления по разным подписчикам.
+    """
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+    pairs = Follow.objects.order_by().values('user', 'author')
+    User.objects.filter(
+        id__in=pairs.annotate(total=Count('id'))
+        .filter(total__gt=1).values('author')
+    ).update(followers_count=Subquery(
+        Follow.objects.filter(author=OuterRef('pk')).order_by()
+        .values('author').annotate(total=Count('user', distinct=True))
+        .values('total')
+    ))
+    Follow.objects.exclude(
+        id__in=pairs.annotate(first_id=Min('id')).values('first_id')
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -25,6 +25,16 @@ class User(AbstractUser):
         'Фамилия',
         max_length=50
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('username',)
@@ -47,6 +57,12 @@ class Follow(models.Model):
 
     class Meta:
         ordering = ('-author_id',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+        )
 
     def __str__(self):
         return str(self.author)